@@ -0,0 +1,167 @@
+"""External services the backend depends on, behind small interfaces.
+
+``BACKEND=gcp`` (the default) builds the real Firestore, Cloud Storage,
+Gemini and Firebase Auth clients. ``BACKEND=fake`` builds the in-memory
+stand-ins from fakes.py, with injected latency and error rates, so the
+whole service can run and be load tested offline.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Callable, Protocol
+
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+
+
+# ---------------------------------------------------------
+# Interfaces (the slice of each client main.py uses)
+# ---------------------------------------------------------
+class DocumentStore(Protocol):
+    """Firestore-shaped: ``collection``, ``get_all``, ``batch`` and ``transaction``."""
+
+    def collection(self, name: str): ...
+
+    def get_all(self, references, field_paths=None, transaction=None): ...
+
+    def batch(self): ...
+
+    def transaction(self, **kwargs): ...
+
+
+class ObjectStorage(Protocol):
+    """Cloud Storage-shaped: ``bucket(name).blob(name)``."""
+
+    def bucket(self, name: str): ...
+
+
+class Model(Protocol):
+    model_name: str
+
+    def generate_content(self, contents=None, generation_config=None, **kwargs): ...
+
+
+class TokenVerifier(Protocol):
+    def verify(self, token: str) -> dict:
+        """Decoded claims; raises if the token is not valid."""
+
+    def warm_up(self):
+        """Fetch whatever ``verify`` needs ahead of the first request."""
+
+
+# ---------------------------------------------------------
+# Lazy singletons
+# ---------------------------------------------------------
+class Lazy:
+    """Thread-safe lazy singleton that forwards attribute access to its value.
+
+    ``factory`` runs once, on first use, so importing main.py doesn't load
+    the client libraries or open connections; ``get()`` returns the object.
+    """
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+@dataclass
+class Backends:
+    db: Lazy  # DocumentStore
+    storage: Lazy  # ObjectStorage
+    model: Lazy  # Model
+    token_verifier: Lazy  # TokenVerifier
+
+
+# ---------------------------------------------------------
+# Real clients
+# ---------------------------------------------------------
+def gcp_backends(
+    project: str,
+    database: str,
+    gemini_api_key: str | None,
+    certs_url: str,
+    token_cache_size: int,
+    audience: str,
+    http_pool_size: int = 16,
+) -> Backends:
+    """Each client is built, and its SDK imported, on first use."""
+
+    def db():
+        from google.cloud import firestore
+        return firestore.Client(project=project, database=database)
+
+    def storage_client():
+        from google.cloud import storage
+        return storage.Client()
+
+    def model():
+        if not gemini_api_key:
+            raise RuntimeError("❌ GEMINI_API_KEY not set")
+        from google import generativeai as genai
+        genai.configure(api_key=gemini_api_key)
+        return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+    def token_verifier():
+        import requests
+        from token_cache import CertCache, VerifiedTokenCache, FirebaseTokenVerifier
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=http_pool_size)
+        session.mount("https://", adapter)
+        return FirebaseTokenVerifier(
+            CertCache(certs_url, session=session),
+            VerifiedTokenCache(max_entries=token_cache_size),
+            audience,
+        )
+
+    return Backends(
+        db=Lazy(db),
+        storage=Lazy(storage_client),
+        model=Lazy(model),
+        token_verifier=Lazy(token_verifier),
+    )
+
+
+# ---------------------------------------------------------
+# In-memory fakes
+# ---------------------------------------------------------
+@dataclass
+class FakeSettings:
+    """Per-call latency in seconds and failure fraction for each fake."""
+
+    firestore_latency: float = 0.0
+    storage_latency: float = 0.0
+    model_latency: float = 0.0
+    auth_latency: float = 0.0
+    error_rate: float = 0.0
+    seed: int | None = None
+
+
+def fake_backends(settings: FakeSettings) -> Backends:
+    from fakes import FakeFirestore, FakeStorageClient, FakeModel, FakeTokenVerifier
+
+    return Backends(
+        db=Lazy(lambda: FakeFirestore(settings.firestore_latency, settings.error_rate, settings.seed)),
+        storage=Lazy(lambda: FakeStorageClient(
+            settings.storage_latency, error_rate=settings.error_rate, seed=settings.seed
+        )),
+        model=Lazy(lambda: FakeModel(settings.model_latency, settings.error_rate, settings.seed)),
+        token_verifier=Lazy(
+            lambda: FakeTokenVerifier(settings.auth_latency, settings.error_rate, settings.seed)
+        ),
+    )
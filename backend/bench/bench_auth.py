@@ -0,0 +1,74 @@
+"""Count outbound cert fetches for Firebase token verification.
+
+    python bench/bench_auth.py
+
+Runs against a local stand-in cert server, so no network is needed.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from token_cache import CertCache, VerifiedTokenCache, FirebaseTokenVerifier  # noqa: E402
+from cert_server import CertServer  # noqa: E402
+
+AUDIENCE = "pothole-webapp"
+REQUESTS = 2000
+USERS = 50
+THREADS = 32
+
+
+class UncachedCerts(CertCache):
+    def certs(self):
+        self._fetch()
+        return self._certs
+
+
+def run(verifier, tokens):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        decoded = list(pool.map(verifier.verify, (tokens[i % len(tokens)] for i in range(REQUESTS))))
+    elapsed = time.perf_counter() - start
+    assert all(d and d["aud"] == AUDIENCE for d in decoded), "verification failed"
+    return elapsed
+
+
+def main():
+    server = CertServer(max_age=3600, latency=0.05).start()
+    try:
+        tokens = [server.mint(AUDIENCE, f"user{i}") for i in range(USERS)]
+
+        certs = CertCache(server.url)
+        verifier = FirebaseTokenVerifier(certs, VerifiedTokenCache(), AUDIENCE)
+
+        # Cold start: many concurrent misses must collapse into one fetch.
+        elapsed = run(verifier, tokens)
+        print(f"cold:     {REQUESTS} verifications in {elapsed:.2f}s, cert fetches={server.hits}")
+        assert server.hits == 1, server.hits
+
+        elapsed = run(verifier, tokens)
+        print(f"warm:     {REQUESTS} verifications in {elapsed:.2f}s, cert fetches={server.hits}")
+        assert server.hits == 1, server.hits
+
+        # Key rotation: new kid costs exactly one more fetch.
+        certs.min_refetch_interval = 0
+        server.rotate()
+        tokens = [server.mint(AUDIENCE, f"user{i}") for i in range(USERS)]
+        elapsed = run(verifier, tokens)
+        print(f"rotated:  {REQUESTS} verifications in {elapsed:.2f}s, cert fetches={server.hits}")
+        assert server.hits == 2, server.hits
+
+        # Baseline: fetch certs on every call, like the old verify_firebase_token.
+        baseline = UncachedCerts(server.url)
+        baseline_verifier = FirebaseTokenVerifier(baseline, VerifiedTokenCache(max_entries=0), AUDIENCE)
+        before = server.hits
+        elapsed = run(baseline_verifier, tokens)
+        print(f"uncached: {REQUESTS} verifications in {elapsed:.2f}s, cert fetches={server.hits - before}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
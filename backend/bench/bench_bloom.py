@@ -0,0 +1,100 @@
+"""Dedupe reads saved by the known-hash Bloom filter.
+
+    python bench/bench_bloom.py [existing_reports] [uploads]
+
+First, Bloom filter sizing: bits, memory and measured false-positive
+rate for a range of BLOOM_ERROR_RATE settings. Then the app with
+BACKEND=fake: the Firestore fake is seeded with existing reports, the
+filter is built from them as at startup, and a stream of uploads (mostly
+new images, some re-uploads) goes through the exact-dedupe check with
+the filter off and on, counting Firestore reads and time spent.
+"""
+import os
+import sys
+import time
+import random
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LATENCY_MS = 5
+DUPLICATE_SHARE = 0.2
+
+os.environ.update({
+    "BACKEND": "fake",
+    "FAKE_FIRESTORE_LATENCY_MS": str(LATENCY_MS),
+    "BLOOM_REFRESH_SECONDS": "0",
+    "JOB_QUEUE_PATH": "/tmp/bench_bloom_jobs.sqlite3",
+})
+sys.path.insert(0, BACKEND)
+
+from bloom import BloomFilter  # noqa: E402
+
+
+def random_hash(rng: random.Random) -> str:
+    return "%032x" % rng.getrandbits(128)
+
+
+def sizing(capacity: int):
+    rng = random.Random(1)
+    members = [random_hash(rng) for _ in range(capacity)]
+    probes = [random_hash(rng) for _ in range(capacity)]
+    print(f"Sizing for {capacity} hashes")
+    print(f"  {'error_rate':>10} {'bits':>10} {'KiB':>7} {'hashes':>6} {'measured':>9} {'add µs':>7} {'check µs':>8}")
+    for error_rate in (0.1, 0.01, 0.001, 0.0001):
+        bloom = BloomFilter(capacity, error_rate)
+        start = time.perf_counter()
+        for h in members:
+            bloom.add(h)
+        add_us = (time.perf_counter() - start) / capacity * 1e6
+        start = time.perf_counter()
+        false_positives = sum(h in bloom for h in probes)
+        check_us = (time.perf_counter() - start) / capacity * 1e6
+        print(
+            f"  {error_rate:>10} {bloom.bits:>10} {bloom.bits / 8 / 1024:>7.0f} {bloom.hashes:>6} "
+            f"{false_positives / capacity:>9.4%} {add_us:>7.2f} {check_us:>8.2f}"
+        )
+
+
+def reads_saved(existing: int, uploads: int):
+    import main
+
+    db = main.db.get()
+    rng = random.Random(2)
+    known = [random_hash(rng) for _ in range(existing)]
+    batch = db.batch()
+    for h in known:
+        batch.set(db.collection("pothole_reports").document(h), {"created_at": "2026-01-01T00:00:00Z"})
+    batch.commit()
+
+    start = time.perf_counter()
+    main.load_known_hashes()
+    print(f"\nFilter built from {existing} reports in {time.perf_counter() - start:.2f}s")
+
+    stream = [
+        rng.choice(known) if rng.random() < DUPLICATE_SHARE else random_hash(rng)
+        for _ in range(uploads)
+    ]
+    print(f"{uploads} uploads, {DUPLICATE_SHARE:.0%} re-uploads, {LATENCY_MS} ms per Firestore round-trip")
+    for enabled in (False, True):
+        main.BLOOM_ENABLED = enabled
+        before = db.round_trips
+        found = 0
+        start = time.perf_counter()
+        for h in stream:
+            found += len(main.lookup_existing([h]))
+        elapsed = time.perf_counter() - start
+        label = "bloom on" if enabled else "bloom off"
+        print(
+            f"  {label:<10} {db.round_trips - before:5d} reads, {found} duplicates found, "
+            f"{elapsed / uploads * 1000:.2f} ms per check"
+        )
+
+
+def main():
+    existing = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    uploads = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    sizing(100_000)
+    reads_saved(existing, uploads)
+
+
+if __name__ == "__main__":
+    main()
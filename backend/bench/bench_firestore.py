@@ -0,0 +1,62 @@
+"""Firestore round-trips per multi-image /analyze request.
+
+    python bench/bench_firestore.py
+
+Runs the app in-process with BACKEND=fake and counts the Firestore fake's
+round-trips for one upload of all the sample images (new records), then
+for the same upload again (every image an exact duplicate). The tracking
+ID block is leased up front so its transaction isn't counted.
+"""
+import os
+import sys
+import glob
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+REPO_ROOT = os.path.join(BACKEND, "..")
+LATENCY_MS = 5
+
+os.environ.update({
+    "BACKEND": "fake",
+    "FAKE_FIRESTORE_LATENCY_MS": str(LATENCY_MS),
+    "JOB_QUEUE_PATH": "/tmp/bench_firestore_jobs.sqlite3",
+})
+sys.path.insert(0, BACKEND)
+
+
+def sample_files():
+    files = []
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, "[1-9].*"))):
+        with open(path, "rb") as f:
+            files.append(("images", (os.path.basename(path), f.read(), "image/jpeg")))
+    return files
+
+
+def main():
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    client = TestClient(app_main.app)
+    db = app_main.db.get()
+    app_main.generate_tracking_id()
+    files = sample_files()
+
+    for label in ("new images", "all duplicates"):
+        before = db.round_trips
+        start = time.perf_counter()
+        r = client.post(
+            "/analyze",
+            files=files,
+            data={"latitude": "41.88", "longitude": "-87.63"},
+            headers={"x-user-token": "bench"},
+        )
+        elapsed = time.perf_counter() - start
+        assert r.status_code == 200, r.text
+        print(
+            f"{label:<15} {len(files)} images: {db.round_trips - before:3d} Firestore round-trips, "
+            f"{elapsed * 1000:6.0f} ms ({LATENCY_MS} ms per round-trip)"
+        )
+
+
+if __name__ == "__main__":
+    main()
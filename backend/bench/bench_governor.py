@@ -0,0 +1,106 @@
+"""Gemini governor against a fake model with a quota and an outage.
+
+    python bench/bench_governor.py
+
+The fake model allows QUOTA calls per second and answers the rest with
+429, like the real API at peak. Many threads call it at once:
+
+  ungoverned   every call goes straight to the model; 429s fail the call
+  governed     token bucket + AIMD concurrency + jittered retries
+  outage       governed, calls arriving steadily below the quota while the
+               model returns 503 for a few seconds; the circuit opens,
+               calls fail fast, then it closes again
+"""
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeModel  # noqa: E402
+from model_governor import (  # noqa: E402
+    AdaptiveConcurrency, CircuitBreaker, ModelGovernor, ModelUnavailable, TokenBucket,
+)
+
+QUOTA = 20  # calls per second
+LATENCY = 0.1
+THREADS = 32
+CALLS = 200
+CONTENTS = [{"role": "user", "parts": [{"text": "assess"}, {"inline_data": {}}]}]
+
+
+def governor(rate=QUOTA, breaker_reset=2.0) -> ModelGovernor:
+    return ModelGovernor(
+        # A small burst: the fake's quota window is one second.
+        TokenBucket(rate=rate, burst=max(1, rate // 4)),
+        AdaptiveConcurrency(8, minimum=1, maximum=THREADS),
+        CircuitBreaker(threshold=5, reset_timeout=breaker_reset),
+        max_retries=6,
+        backoff_base=0.2,
+        backoff_max=2.0,
+        queue_timeout=60,
+    )
+
+
+def run(label, model, call, calls=CALLS, during=None, interval=0.0):
+    outcomes = {"ok": 0, "model error": 0, "rejected": 0}
+    lock = threading.Lock()
+    latencies = []
+
+    def one(i):
+        if interval:
+            time.sleep(max(0.0, begin + i * interval - time.perf_counter()))
+        start = time.perf_counter()
+        try:
+            call(lambda: model.generate_content(contents=CONTENTS))
+            kind = "ok"
+        except ModelUnavailable:
+            kind = "rejected"
+        except Exception:
+            kind = "model error"
+        with lock:
+            outcomes[kind] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = begin = time.perf_counter()
+    if during:
+        threading.Thread(target=during, daemon=True).start()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<11} {elapsed:5.1f}s  {outcomes}  model calls {model.calls}, "
+        f"429s {model.throttled}, p95 {p95 * 1000:.0f} ms"
+    )
+    return outcomes
+
+
+def main():
+    print(f"{CALLS} calls from {THREADS} threads; model quota {QUOTA}/s, {LATENCY * 1000:.0f} ms per call")
+
+    run("ungoverned", FakeModel(LATENCY, quota_per_second=QUOTA), lambda fn: fn())
+
+    g = governor()
+    out = run("governed", FakeModel(LATENCY, quota_per_second=QUOTA), g.call)
+    print(f"            governor {g.stats()}")
+    assert out["ok"] == CALLS
+
+    g = governor()
+    model = FakeModel(LATENCY, quota_per_second=QUOTA)
+
+    def outage():
+        time.sleep(1.0)
+        model.fail_for(3.0)
+
+    out = run("outage", model, g.call, calls=120, during=outage, interval=1 / (QUOTA / 2))
+    print(f"            governor {g.stats()}")
+    assert g.breaker.opened >= 1 and g.breaker.state == CircuitBreaker.CLOSED
+    assert out["rejected"] > 0 and out["ok"] > 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""End-to-end load benchmark for /analyze, /status and /myreports.
+
+    python bench/bench_load.py [--rps 20] [--duration 30] [--mix analyze=1,status=3,myreports=2]
+
+Starts the app under uvicorn in a child process with BACKEND=fake (no GCP
+needed; latency and error rates of the fakes are set with the flags
+below), seeds a few reports, then fires requests open-loop at the target
+rate for ``--duration`` seconds and reports throughput and p50/p95/p99
+latency per endpoint. Uploads use the sample images in the repo root;
+each upload gets unique trailing bytes and coordinates so it runs the
+full pipeline instead of being deduped. ``--json`` writes the summary for
+comparison between runs in CI.
+"""
+import os
+import sys
+import json
+import time
+import glob
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+REPO_ROOT = os.path.join(BACKEND, "..")
+IMAGE_TYPES = {".jpeg": "image/jpeg", ".jpg": "image/jpeg", ".webp": "image/webp", ".png": "image/png"}
+
+
+def sample_images() -> list[tuple[str, bytes, str]]:
+    images = []
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, "[1-9].*"))):
+        mime = IMAGE_TYPES.get(os.path.splitext(path)[1].lower())
+        if mime:
+            with open(path, "rb") as f:
+                images.append((os.path.basename(path), f.read(), mime))
+    if not images:
+        sys.exit("No sample images (1.jpeg-9.jpeg) found in the repo root")
+    return images
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("analyze", "status", "myreports"):
+            sys.exit(f"Unknown endpoint in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadRun:
+    def __init__(self, client, args, images):
+        self.client = client
+        self.args = args
+        self.images = images
+        self.rng = random.Random(args.seed)
+        self.tracking_ids: list[str] = []
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.in_flight = 0
+        self.dropped = 0
+
+    def user(self) -> str:
+        return f"bench-user-{self.rng.randrange(self.args.users)}"
+
+    def upload_files(self):
+        files = []
+        for _ in range(self.args.images_per_request):
+            name, data, mime = self.rng.choice(self.images)
+            # Trailing bytes after the image make each upload's MD5 unique.
+            files.append(("images", (name, data + self.rng.randbytes(16), mime)))
+        return files
+
+    async def analyze(self):
+        r = await self.client.post(
+            "/analyze",
+            files=self.upload_files(),
+            data={
+                "latitude": f"{41.88 + self.rng.uniform(-1, 1):.6f}",
+                "longitude": f"{-87.63 + self.rng.uniform(-1, 1):.6f}",
+            },
+            headers={"x-user-token": self.user()},
+        )
+        if r.status_code == 200:
+            for record in r.json().get("results", []):
+                if record.get("tracking_id"):
+                    self.tracking_ids.append(record["tracking_id"])
+        return r.status_code
+
+    async def status(self):
+        if not self.tracking_ids:
+            return await self.analyze()
+        r = await self.client.get(
+            f"/status/{self.rng.choice(self.tracking_ids)}", headers={"x-user-token": self.user()}
+        )
+        return r.status_code
+
+    async def myreports(self):
+        r = await self.client.get(
+            "/myreports", params={"limit": 20}, headers={"x-user-token": self.user()}
+        )
+        return r.status_code
+
+    async def timed(self, endpoint: str):
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            code = await getattr(self, endpoint)()
+        except Exception as e:
+            print(f"{endpoint} request failed: {e!r}")
+            code = 0
+        finally:
+            self.in_flight -= 1
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[code] = counts.get(code, 0) + 1
+
+    async def drive(self):
+        mix = parse_mix(self.args.mix)
+        endpoints, weights = list(mix), list(mix.values())
+        interval = 1.0 / self.args.rps
+        tasks = []
+        start = time.perf_counter()
+        n = 0
+        while True:
+            due = start + n * interval
+            if due - start >= self.args.duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            n += 1
+            # Open loop: arrivals don't wait for earlier requests, up to a cap.
+            if self.in_flight >= self.args.max_in_flight:
+                self.dropped += 1
+                continue
+            endpoint = self.rng.choices(endpoints, weights)[0]
+            tasks.append(asyncio.create_task(self.timed(endpoint)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+async def run(url: str, args, images) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        load = LoadRun(client, args, images)
+        for _ in range(args.seed_reports):
+            await load.analyze()
+        elapsed = await load.drive()
+
+    summary = {"target_rps": args.rps, "elapsed_s": round(elapsed, 2), "dropped": load.dropped, "endpoints": {}}
+    for endpoint, values in sorted(load.latencies.items()):
+        values.sort()
+        summary["endpoints"][endpoint] = {
+            "requests": len(values),
+            "rps": round(len(values) / elapsed, 2),
+            "status": load.statuses[endpoint],
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+    return summary
+
+
+def report(summary: dict):
+    print(
+        f"target {summary['target_rps']} rps for {summary['elapsed_s']}s, "
+        f"{summary['dropped']} arrivals dropped at the in-flight cap"
+    )
+    print(f"{'endpoint':<10} {'reqs':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  status")
+    for endpoint, s in summary["endpoints"].items():
+        print(
+            f"{endpoint:<10} {s['requests']:>6} {s['rps']:>7.2f} {s['p50_ms']:>8.1f} "
+            f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}  {s['status']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default="analyze=1,status=3,myreports=2")
+    parser.add_argument("--images-per-request", type=int, default=1)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed-reports", type=int, default=10)
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--firestore-latency-ms", type=float, default=5)
+    parser.add_argument("--storage-latency-ms", type=float, default=20)
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    import httpx
+
+    images = sample_images()
+    port = free_port()
+    env = {
+        **os.environ,
+        "BACKEND": "fake",
+        "FAKE_FIRESTORE_LATENCY_MS": str(args.firestore_latency_ms),
+        "FAKE_STORAGE_LATENCY_MS": str(args.storage_latency_ms),
+        "FAKE_MODEL_LATENCY_MS": str(args.model_latency_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+        "FAKE_SEED": str(args.seed),
+        "JOB_QUEUE_PATH": os.path.join("/tmp", f"bench_load_jobs_{port}.sqlite3"),
+    }
+    child = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=BACKEND,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                httpx.get(f"{url}/docs", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        summary = asyncio.run(run(url, args, images))
+    finally:
+        child.terminate()
+        child.wait()
+        try:
+            os.remove(env["JOB_QUEUE_PATH"])
+        except OSError:
+            pass
+
+    report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
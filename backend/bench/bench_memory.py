@@ -0,0 +1,132 @@
+"""Peak RSS of the service while many large images are uploaded at once.
+
+    python bench/bench_memory.py [concurrent_uploads]
+
+Starts the app under uvicorn in a child process backed by the in-memory
+fakes (no GCP needed), fires concurrent /analyze uploads of distinct
+~10 MB JPEGs, and reads the child's peak RSS (VmHWM). Run once with
+whole-file reads and once with streaming uploads.
+"""
+import io
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IMAGE_MB = 10
+
+
+def serve(port: int):
+    sys.path.insert(0, BACKEND)
+    from google.cloud import firestore, storage
+    from fakes import FakeFirestore, FakeStorageClient, FakeModel
+
+    firestore.Client = lambda *a, **k: FakeFirestore()
+    storage.Client = lambda *a, **k: FakeStorageClient(keep_data=False)
+
+    import main
+    import uvicorn
+
+    fake_model = FakeModel(latency=0.2)
+    main.get_gemini_model = lambda: fake_model
+    main.verify_firebase_token = lambda token: {"user_id": "bench", "email": "bench@example.com"}
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def make_images(count: int, directory: str) -> list[str]:
+    from PIL import Image
+
+    rng = random.Random(1)
+    side = 2600
+    base = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buf = io.BytesIO()
+    base.save(buf, "JPEG", quality=95)
+    jpeg = buf.getvalue()
+
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"img{i}.jpg")
+        with open(path, "wb") as f:
+            # Trailing bytes after EOI make each file's MD5 unique.
+            f.write(jpeg + rng.randbytes(IMAGE_MB * 1024 * 1024 - len(jpeg) if len(jpeg) < IMAGE_MB * 1024 * 1024 else 16))
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(label: str, env: dict, paths: list[str]):
+    import httpx
+
+    port = free_port()
+    child = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port)],
+        env={**os.environ, "GEMINI_API_KEY": "bench", "PHASH_MAX_DISTANCE": "-1", **env},
+        cwd=BACKEND,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/docs", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        idle = peak_rss_mb(child.pid)
+
+        def upload(path):
+            with open(path, "rb") as f:
+                r = httpx.post(
+                    f"{url}/analyze",
+                    files={"images": (os.path.basename(path), f, "image/jpeg")},
+                    data={"latitude": "41.88", "longitude": "-87.63"},
+                    headers={"x-user-token": "bench"},
+                    timeout=120,
+                )
+            return r.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(len(paths)) as pool:
+            codes = list(pool.map(upload, paths))
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb(child.pid)
+    finally:
+        child.terminate()
+        child.wait()
+
+    summary = {c: codes.count(c) for c in sorted(set(codes))}
+    print(f"{label:<34} idle {idle:7.1f} MB  peak {peak:7.1f} MB  {elapsed:5.1f}s  status {summary}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_images(count, tmp)
+        print(f"{count} concurrent uploads of {IMAGE_MB} MB")
+        run("whole-file reads", {"UPLOAD_STREAMING": "false"}, paths)
+        run("streaming", {"UPLOAD_STREAMING": "true"}, paths)
+        run("streaming, 64 MB in-flight cap", {"UPLOAD_STREAMING": "true", "UPLOAD_MAX_INFLIGHT_BYTES": str(64 * 1024 * 1024), "UPLOAD_QUEUE_TIMEOUT": "60"}, paths)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--serve":
+        serve(int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,114 @@
+"""Benchmark /nearby lookups over synthetic city-scale data.
+
+    python bench/bench_nearby.py [num_reports]
+
+Emulates Firestore's ordered single-field index on ``geohash`` with a
+sorted list, so the numbers reflect documents read by the geohash range
+scans versus a full collection scan.
+"""
+import os
+import sys
+import time
+import bisect
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import geo  # noqa: E402
+
+CENTER = (41.8781, -87.6298)  # Chicago
+SPAN_DEG = 0.35  # ~40 km across
+RADIUS_M = 200
+QUERIES = 200
+
+
+class Doc:
+    def __init__(self, record):
+        self._record = record
+
+    def to_dict(self):
+        return dict(self._record)
+
+
+class IndexedCollection:
+    """Just enough of a Firestore collection for geohash range queries."""
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda r: r["geohash"])
+        self.keys = [r["geohash"] for r in self.records]
+        self.reads = 0
+        self._lo = None
+
+    def where(self, field, op, value):
+        if op == ">=":
+            self._lo = value
+            return self
+        lo = bisect.bisect_left(self.keys, self._lo)
+        hi = bisect.bisect_left(self.keys, value)
+        return RangeQuery(self, lo, hi)
+
+
+class RangeQuery:
+    def __init__(self, collection, lo, hi):
+        self.collection = collection
+        self.lo, self.hi = lo, hi
+
+    def stream(self):
+        self.collection.reads += self.hi - self.lo
+        for record in self.collection.records[self.lo:self.hi]:
+            yield Doc(record)
+
+
+def synthetic_reports(n):
+    rng = random.Random(42)
+    lat0, lon0 = CENTER
+    # Clustered like real reports: most near a few hundred busy roads.
+    hotspots = [(lat0 + rng.uniform(-SPAN_DEG, SPAN_DEG) / 2, lon0 + rng.uniform(-SPAN_DEG, SPAN_DEG) / 2) for _ in range(500)]
+    records = []
+    for _ in range(n):
+        if rng.random() < 0.7:
+            hlat, hlon = rng.choice(hotspots)
+            lat, lon = rng.gauss(hlat, 0.004), rng.gauss(hlon, 0.004)
+        else:
+            lat = lat0 + rng.uniform(-SPAN_DEG, SPAN_DEG) / 2
+            lon = lon0 + rng.uniform(-SPAN_DEG, SPAN_DEG) / 2
+        records.append({"latitude": lat, "longitude": lon, "geohash": geo.encode(lat, lon)})
+    return records, hotspots
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    t = time.perf_counter()
+    records, hotspots = synthetic_reports(n)
+    collection = IndexedCollection(records)
+    print(f"built {n} reports + index in {time.perf_counter() - t:.1f}s")
+
+    rng = random.Random(7)
+    points = [rng.choice(hotspots) for _ in range(QUERIES)]
+
+    t = time.perf_counter()
+    found = 0
+    for lat, lon in points:
+        found += len(geo.query_nearby(collection, lat, lon, RADIUS_M))
+    elapsed = time.perf_counter() - t
+    print(
+        f"geohash:   {QUERIES} queries  {elapsed / QUERIES * 1000:8.2f} ms/query  "
+        f"{collection.reads / QUERIES:10.0f} docs read/query  {found / QUERIES:.0f} hits/query"
+    )
+
+    scan_queries = 5
+    t = time.perf_counter()
+    scan_found = 0
+    for lat, lon in points[:scan_queries]:
+        scan_found += sum(
+            1 for r in records if geo.haversine_m(lat, lon, r["latitude"], r["longitude"]) <= RADIUS_M
+        )
+    elapsed = time.perf_counter() - t
+    print(
+        f"full scan: {scan_queries} queries  {elapsed / scan_queries * 1000:8.2f} ms/query  "
+        f"{n:10d} docs read/query  {scan_found / scan_queries:.0f} hits/query"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start time: process start to first HTTP response.
+
+    python bench/bench_startup.py [runs]
+
+Starts the app under uvicorn in a fresh child process several times and
+times it from spawn to the first 200 from GET /metrics (a route that
+touches no backend), plus the time to ``import main`` alone and which
+Google SDK modules that import pulls in. Runs with BACKEND=gcp pointed at
+the Firestore/Storage emulator env vars so the real client libraries
+load without credentials or network; nothing is actually contacted.
+"""
+import os
+import sys
+import time
+import socket
+import statistics
+import subprocess
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SDK_MODULES = ("google.generativeai", "google.cloud.firestore", "google.cloud.storage")
+
+IMPORT_PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+loaded = [m for m in {SDK_MODULES!r} if m in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+ENV = {
+    "BACKEND": "gcp",
+    "GEMINI_API_KEY": "bench",
+    "FIRESTORE_EMULATOR_HOST": "127.0.0.1:1",
+    "STORAGE_EMULATOR_HOST": "http://127.0.0.1:1",
+    "PHASH_MAX_DISTANCE": "-1",
+    "JOB_QUEUE_PATH": "/tmp/bench_startup_jobs.sqlite3",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response() -> float:
+    import httpx
+
+    port = free_port()
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **ENV},
+        cwd=BACKEND,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            if child.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.005)
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def import_time() -> tuple[float, str]:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_PROBE],
+        env={**os.environ, **ENV},
+        cwd=BACKEND,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip().splitlines()[-1]
+    seconds, _, loaded = out.partition(" ")
+    return float(seconds), loaded or "none"
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    imports = [import_time() for _ in range(runs)]
+    first = [time_to_first_response() for _ in range(runs)]
+    print(f"{runs} runs, median")
+    print(f"  import main             {statistics.median(t for t, _ in imports) * 1000:7.0f} ms")
+    print(f"  spawn -> first response {statistics.median(first) * 1000:7.0f} ms")
+    print(f"  SDKs loaded by import   {imports[-1][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Render a zoomed-out map view over a million synthetic reports.
+
+    python bench/bench_tiles.py [num_reports]
+
+Fills a TileIndex with reports scattered over a city, then renders the
+tiles of a 1280x800 px viewport at zoom 10 (the whole city on screen):
+cold, from the LRU, and after one new report invalidates its tiles. For
+comparison it bins every record into the same clusters by scanning them,
+which is what serving the map from raw records would cost, and reports
+the payload size of both.
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tiles import TileIndex, tile_xy  # noqa: E402
+
+CENTER = (41.8781, -87.6298)  # Chicago
+SPAN_DEG = 0.35  # ~40 km across
+ZOOM = 10
+VIEWPORT = (1280, 800)  # px; tiles are 256 px
+
+
+class Doc:
+    def __init__(self, record):
+        self._record = record
+
+    def to_dict(self):
+        return self._record
+
+
+class Collection:
+    """Just enough of a Firestore collection for ``TileIndex.load``."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        for lat, lon, severity in self.records:
+            yield Doc({"latitude": lat, "longitude": lon, "severity": severity})
+
+
+def viewport_tiles():
+    cx, cy = tile_xy(*CENTER, ZOOM)
+    cols, rows = VIEWPORT[0] // 256 + 1, VIEWPORT[1] // 256 + 1
+    return [
+        (ZOOM, cx + dx, cy + dy)
+        for dx in range(-(cols // 2), cols - cols // 2)
+        for dy in range(-(rows // 2), rows - rows // 2)
+    ]
+
+
+def scan_clusters(records, tiles, bin_bits):
+    """Baseline: bin every record into the viewport's clusters."""
+    wanted = set(tiles)
+    clusters = {}
+    level = ZOOM + bin_bits
+    for lat, lon, severity in records:
+        bx, by = tile_xy(lat, lon, level)
+        if (ZOOM, bx >> bin_bits, by >> bin_bits) in wanted:
+            cell = clusters.setdefault((bx, by), {"count": 0, "severity": {}})
+            cell["count"] += 1
+            cell["severity"][severity] = cell["severity"].get(severity, 0) + 1
+    return clusters
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    records = [
+        (
+            CENTER[0] + rng.uniform(-SPAN_DEG / 2, SPAN_DEG / 2),
+            CENTER[1] + rng.uniform(-SPAN_DEG / 2, SPAN_DEG / 2),
+            str(rng.randint(1, 5)),
+        )
+        for _ in range(n)
+    ]
+
+    index = TileIndex()
+    _, build = timed(lambda: index.load(Collection(records)))
+    tiles = viewport_tiles()
+    print(f"{n} reports, index built in {build:.1f}s ({index.cells()} cells at zoom {index.base})")
+    print(f"viewport {VIEWPORT[0]}x{VIEWPORT[1]} px at zoom {ZOOM}: {len(tiles)} tiles")
+
+    rendered, cold = timed(lambda: [index.tile(*t) for t in tiles])
+    _, warm = timed(lambda: [index.tile(*t) for t in tiles])
+    assert sum(t["count"] for t in rendered) == n
+    _, write = timed(lambda: index.add(*CENTER, "4"))
+    _, after_write = timed(lambda: [index.tile(*t) for t in tiles])
+
+    clusters, scan = timed(lambda: scan_clusters(records, tiles, index.bin_bits))
+    assert len(clusters) == sum(len(t["clusters"]) for t in rendered)
+
+    tile_bytes = len(json.dumps(rendered))
+    raw_bytes = len(json.dumps([{"latitude": lat, "longitude": lon, "severity": s} for lat, lon, s in records]))
+    print(f"  tiles, cold           {cold * 1000:8.2f} ms")
+    print(f"  tiles, cached         {warm * 1000:8.2f} ms")
+    print(f"  tiles, after a write  {after_write * 1000:8.2f} ms")
+    print(f"  one write             {write * 1000:8.2f} ms")
+    print(f"  scan all records      {scan * 1000:8.0f} ms")
+    print(f"  payload: tiles {tile_bytes / 1024:.0f} KiB vs every record {raw_bytes / 2 ** 20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
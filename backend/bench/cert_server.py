@@ -0,0 +1,100 @@
+"""Local stand-in for Google's securetoken cert endpoint.
+
+Serves a JSON ``{kid: pem_cert}`` map with a Cache-Control max-age and
+counts how many times it was fetched. Also mints RS256 Firebase-style
+ID tokens signed by the served keys.
+"""
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from jose import jwt
+
+
+def make_keypair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.local")])
+    now = datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    return key_pem, cert_pem
+
+
+class CertServer:
+    def __init__(self, max_age: int = 3600, latency: float = 0.0):
+        self.max_age = max_age
+        self.latency = latency
+        self.keys: dict[str, tuple[str, str]] = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        self.rotate()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.hits += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = json.dumps({kid: cert for kid, (_, cert) in server.keys.items()}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={server.max_age}")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/certs"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def rotate(self) -> str:
+        """Replace the signing keys with a fresh one and return its kid."""
+        kid = f"kid-{len(self.keys)}-{int(time.time() * 1000)}"
+        self.keys = {kid: make_keypair()}
+        self.current_kid = kid
+        return kid
+
+    def mint(self, audience: str, uid: str, ttl: int = 3600) -> str:
+        key_pem, _ = self.keys[self.current_kid]
+        now = int(time.time())
+        claims = {
+            "aud": audience,
+            "iss": f"https://securetoken.google.com/{audience}",
+            "sub": uid,
+            "user_id": uid,
+            "email": f"{uid}@example.com",
+            "iat": now,
+            "exp": now + ttl,
+        }
+        return jwt.encode(claims, key_pem, algorithm="RS256", headers={"kid": self.current_kid})
@@ -0,0 +1,93 @@
+"""Score images with the local prefilter and pick its thresholds.
+
+    python bench/tune_prefilter.py [--keep DIR ...] [--skip DIR ...]
+
+Images that must reach Gemini ("keep") are the repo's sample photos plus
+any --keep directories; images that should be screened out ("skip") are
+darkened, blurred and off-topic variants generated from the samples plus
+any --skip directories (e.g. uploads Gemini called no_damage). Prints
+each image's features and confidence, then for a range of thresholds how
+many skip images would be screened and how many keep images would be
+lost. PREFILTER_REJECT_BELOW / PREFILTER_NO_DAMAGE_BELOW should stay
+under the lowest keep confidence.
+"""
+import io
+import os
+import sys
+import glob
+import argparse
+
+from PIL import Image, ImageEnhance, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import prefilter  # noqa: E402
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+THRESHOLDS = [round(0.05 * i, 2) for i in range(1, 20)]
+
+
+def encode(img: Image.Image) -> bytes:
+    out = io.BytesIO()
+    img.convert("RGB").save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+def images_in(directory: str, pattern: str = "*"):
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                yield os.path.basename(path), f.read()
+
+
+def synthetic_skips(samples):
+    """Unusable versions of road photos, and pictures of something else."""
+    for name, data in samples:
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        yield f"{name} (dark)", encode(ImageEnhance.Brightness(img).enhance(0.12))
+        yield f"{name} (blurred)", encode(img.filter(ImageFilter.GaussianBlur(max(img.size) / 80)))
+    sky = Image.linear_gradient("L").resize((320, 240))
+    blue = (sky.point(lambda v: v // 3), sky.point(lambda v: v // 2), sky.point(lambda v: 150 + v // 3))
+    yield "sky gradient", encode(Image.merge("RGB", blue))
+    leaves = Image.effect_noise((320, 240), 60)
+    green = (leaves.point(lambda v: v // 3), leaves, leaves.point(lambda v: v // 4))
+    yield "foliage", encode(Image.merge("RGB", green))
+    yield "blank", encode(Image.new("RGB", (320, 240), (128, 128, 128)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep", action="append", default=[], help="directory of images that must reach Gemini")
+    parser.add_argument("--skip", action="append", default=[], help="directory of images that may be screened out")
+    args = parser.parse_args()
+
+    samples = list(images_in(REPO_ROOT, "[1-9].*"))
+    keep = samples + [img for d in args.keep for img in images_in(d)]
+    skip = list(synthetic_skips(samples)) + [img for d in args.skip for img in images_in(d)]
+
+    scored = {"keep": [], "skip": []}
+    print(f"{'image':<32} {'label':<5} {'bright':>6} {'sharp':>8} {'road':>5} {'texture':>7} {'conf':>5}  reason")
+    for label, images in (("keep", keep), ("skip", skip)):
+        for name, data in images:
+            features = prefilter.image_features(data)
+            if features is None:
+                print(f"{name:<32} {label:<5} (not decodable)")
+                continue
+            result = prefilter.classify(features, 0.0, 0.0)
+            scored[label].append(result)
+            print(
+                f"{name[-32:]:<32} {label:<5} {features['brightness']:6.2f} {features['sharpness']:8.2f} "
+                f"{features['road']:5.2f} {features['texture']:7.2f} {result.confidence:5.2f}  {result.reason}"
+            )
+
+    print(f"\n{'threshold':>9}  {'skip screened':>13}  {'keep lost':>9}")
+    for threshold in THRESHOLDS:
+        screened = sum(r.confidence < threshold for r in scored["skip"])
+        lost = sum(r.confidence < threshold for r in scored["keep"])
+        print(f"{threshold:9.2f}  {screened:6d}/{len(scored['skip']):<6d}  {lost:4d}/{len(scored['keep'])}")
+    if scored["keep"]:
+        print(f"\nlowest keep confidence: {min(r.confidence for r in scored['keep']):.2f}")
+
+
+if __name__ == "__main__":
+    main()
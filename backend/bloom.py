@@ -0,0 +1,104 @@
+import math
+import json
+import hashlib
+import threading
+
+# ---------------------------------------------------------
+# Bloom filter
+# ---------------------------------------------------------
+SNAPSHOT_VERSION = 1
+
+
+def optimal_size(capacity: int, error_rate: float) -> tuple[int, int]:
+    """``(bits, hashes)`` for ``capacity`` keys at a false-positive rate of ``error_rate``."""
+    capacity = max(1, capacity)
+    error_rate = min(max(error_rate, 1e-9), 0.5)
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false-positive rate.
+
+    ``key in bloom`` being False means the key was never added. Sized for
+    ``capacity`` keys at ``error_rate``; past capacity it keeps working
+    with a rising false-positive rate (see ``estimated_error_rate``).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits, self.hashes = optimal_size(capacity, error_rate)
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str) -> bool:
+        """Add ``key``; False if it (probably) was already present."""
+        positions = self._positions(key)
+        with self._lock:
+            new = False
+            for pos in positions:
+                byte, mask = pos >> 3, 1 << (pos & 7)
+                if not self._array[byte] & mask:
+                    self._array[byte] |= mask
+                    new = True
+            if new:
+                self.count += 1
+            return new
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    def estimated_error_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def union(self, other: "BloomFilter"):
+        """Add every key of ``other`` (same size and hash count)."""
+        if (other.bits, other.hashes) != (self.bits, self.hashes):
+            raise ValueError("Bloom filters differ in size")
+        with self._lock:
+            merged = int.from_bytes(self._array, "little") | int.from_bytes(other._array, "little")
+            self._array = bytearray(merged.to_bytes(len(self._array), "little"))
+            self.count = max(self.count, other.count)
+
+    # --- Snapshots ---
+    def to_bytes(self, **meta) -> bytes:
+        """Header line of JSON (size, count, plus ``meta``) followed by the bit array."""
+        with self._lock:
+            header = {
+                "version": SNAPSHOT_VERSION,
+                "capacity": self.capacity,
+                "error_rate": self.error_rate,
+                "bits": self.bits,
+                "hashes": self.hashes,
+                "count": self.count,
+                **meta,
+            }
+            return json.dumps(header).encode("utf-8") + b"\n" + bytes(self._array)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> tuple["BloomFilter", dict]:
+        """The filter in a ``to_bytes`` snapshot, and its header."""
+        line, _, array = data.partition(b"\n")
+        header = json.loads(line)
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported Bloom snapshot version {header.get('version')}")
+        bloom = cls(header["capacity"], header["error_rate"])
+        if (bloom.bits, bloom.hashes) != (header["bits"], header["hashes"]) or len(array) != len(bloom._array):
+            raise ValueError("Bloom snapshot is corrupt")
+        bloom._array = bytearray(array)
+        bloom.count = header["count"]
+        return bloom, header
@@ -0,0 +1,276 @@
+"""Bulk-import an archive of road photos through the /analyze pipeline.
+
+    python bulk_import.py /path/to/archive [--processes 8] [--concurrency 8]
+
+Walks the directory and takes each photo's location from its EXIF GPS
+tags (``--latitude``/``--longitude`` for photos without a fix; else the
+photo is skipped). A process pool hashes each file and checks that it
+decodes; a bounded number of files at a time then go through
+``main.run_analysis``, the same MD5 dedupe, upload, Gemini assessment,
+tracking ID and record write that POST /analyze uses. Uses the same
+environment (BACKEND, GEMINI_*, bucket) as the server.
+
+Progress is checkpointed in SQLite (``--checkpoint``); a re-run skips
+files already imported, so an interrupted import resumes where it
+stopped. Failed and skipped files are tried again.
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import argparse
+import mimetypes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import imaging
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff")
+DONE = ("new", "deduped")
+
+
+# ---------------------------------------------------------
+# Process-pool side: hash + decode
+# ---------------------------------------------------------
+def scan_file(path: str) -> dict:
+    """MD5, EXIF GPS and a quick decode of one file."""
+    md5 = hashlib.md5()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+            size += len(chunk)
+
+    scanned = {"size": size, "image_hash": md5.hexdigest(), "gps": None, "error": None}
+    try:
+        with Image.open(path) as img:
+            scanned["gps"] = imaging.gps_coordinates(img)
+            # A reduced-scale decode still catches truncated or corrupt files.
+            img.draft("RGB", (256, 256))
+            img.load()
+    except Exception as e:
+        scanned["error"] = f"not a readable image: {e}"
+    return scanned
+
+
+# ---------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------
+class Checkpoint:
+    """Outcome of every file seen, keyed by absolute path.
+
+    A file counts as imported only while its size and mtime are unchanged.
+    """
+
+    def __init__(self, path: str, commit_every: int = 100):
+        self.commit_every = commit_every
+        self._pending = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS imported ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " image_hash TEXT,"
+            " tracking_id TEXT,"
+            " detail TEXT,"
+            " updated REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def imported(self) -> dict[str, tuple[int, int]]:
+        rows = self._db.execute(
+            f"SELECT path, size, mtime_ns FROM imported WHERE status IN ({','.join('?' * len(DONE))})", DONE
+        )
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def record(self, path, size, mtime_ns, status, image_hash=None, tracking_id=None, detail=None):
+        self._db.execute(
+            "INSERT OR REPLACE INTO imported VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, status, image_hash, tracking_id, detail, time.time()),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def find_images(root: str, imported: dict[str, tuple[int, int]]):
+    """``(path, size, mtime_ns)`` of every image under ``root`` not imported yet; plus the skip count."""
+    todo, already = [], 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, name))
+            st = os.stat(path)
+            if imported.get(path) == (st.st_size, st.st_mtime_ns):
+                already += 1
+                continue
+            todo.append((path, st.st_size, st.st_mtime_ns))
+    return todo, already
+
+
+# ---------------------------------------------------------
+# Import
+# ---------------------------------------------------------
+class Progress:
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.counts = {"new": 0, "deduped": 0, "skipped": 0, "failed": 0}
+        self.start = self._last = time.perf_counter()
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        counts = ", ".join(f"{k} {v}" for k, v in self.counts.items())
+        return f"{self.done}/{self.total} files in {elapsed:.1f}s, {rate:.1f} files/s ({counts})"
+
+    def add(self, status: str):
+        self.counts[status] += 1
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            print(self.line(), flush=True)
+
+
+async def import_archive(args, processes: ProcessPoolExecutor) -> Progress:
+    # Imported here so the pool's worker processes never load the app.
+    import main
+
+    checkpoint = Checkpoint(args.checkpoint)
+    todo, already = find_images(args.root, checkpoint.imported())
+    print(f"{len(todo)} files to import, {already} already imported", flush=True)
+
+    if main.PHASH_MAX_DISTANCE >= 0:
+        main.load_near_dup_index()
+    if main.BLOOM_ENABLED:
+        # Dedupe checks read Firestore until the filter is ready.
+        threading.Thread(target=main.load_known_hashes, daemon=True).start()
+    model = main.get_gemini_model()
+    fallback = (args.latitude, args.longitude) if args.latitude is not None else None
+
+    loop = asyncio.get_running_loop()
+    progress = Progress(len(todo), args.progress)
+    io_limit = asyncio.Semaphore(args.concurrency)
+    # Bounds the files in flight (scanned or waiting for I/O), not just the I/O.
+    window = asyncio.Semaphore(args.concurrency * 2 + args.processes * 2)
+    # Copies of one photo in the archive: later ones wait for the first
+    # instead of racing it past the Firestore dedupe lookup.
+    first_copy: dict[str, asyncio.Future] = {}
+
+    async def analyze(path: str, scanned: dict, coords) -> dict:
+        image_hash = scanned["image_hash"]
+        while (earlier := first_copy.get(image_hash)) is not None:
+            record = await asyncio.shield(earlier)
+            if record is not None:
+                return {**record, "deduped": True}
+            if first_copy.get(image_hash) is earlier:
+                break  # that copy failed; this one goes through the pipeline
+        future = first_copy[image_hash] = loop.create_future()
+        record = None
+        try:
+            content_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+            async with io_limit:
+                with open(path, "rb") as f:
+                    item = main.ImageInput(f, scanned["size"], os.path.basename(path), content_type)
+                    results = await main.run_analysis(
+                        [item], coords[0], coords[1], args.user_id, args.email, model,
+                        hashes=[image_hash],
+                    )
+            record = results[0]
+            return record
+        finally:
+            future.set_result(record)
+
+    async def handle(path: str, size: int, mtime_ns: int):
+        status, image_hash, tracking_id, detail = "failed", None, None, None
+        try:
+            scanned = await loop.run_in_executor(processes, scan_file, path)
+            image_hash = scanned["image_hash"]
+            coords = scanned["gps"] or fallback
+            if scanned["error"]:
+                detail = scanned["error"]
+            elif coords is None:
+                status, detail = "skipped", "no EXIF GPS position"
+            else:
+                record = await analyze(path, scanned, coords)
+                status = "deduped" if record.get("deduped") else "new"
+                tracking_id = record.get("tracking_id")
+        except main.ImageProcessingError as e:
+            detail = e.message
+        except Exception as e:
+            detail = str(e) or type(e).__name__
+        finally:
+            window.release()
+        if status == "failed":
+            print(f"failed: {path}: {detail}", file=sys.stderr, flush=True)
+        checkpoint.record(path, size, mtime_ns, status, image_hash, tracking_id, detail)
+        progress.add(status)
+
+    tasks = []
+    try:
+        for path, size, mtime_ns in todo:
+            await window.acquire()
+            tasks.append(asyncio.create_task(handle(path, size, mtime_ns)))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        checkpoint.close()
+    return progress
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import a directory of road photos.")
+    parser.add_argument("root", help="directory to walk")
+    parser.add_argument("--checkpoint", default="bulk_import.sqlite3", help="progress database (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="hash/decode processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="files in the upload/Gemini/write stage at once")
+    parser.add_argument("--latitude", type=float, help="position for photos without EXIF GPS")
+    parser.add_argument("--longitude", type=float)
+    parser.add_argument("--user-id", default="bulk-import", help="user_id stored on new records")
+    parser.add_argument("--email", default=None, help="email stored on new records")
+    parser.add_argument("--progress", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    if (args.latitude is None) != (args.longitude is None):
+        parser.error("--latitude and --longitude go together")
+    if not os.path.isdir(args.root):
+        parser.error(f"not a directory: {args.root}")
+    args.processes = max(1, args.processes)
+    args.concurrency = max(1, args.concurrency)
+    return args
+
+
+def run(argv=None) -> int:
+    args = parse_args(argv)
+    # spawn: the workers must not inherit the gRPC/HTTP client threads of the parent.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.processes, mp_context=context) as processes:
+        progress = asyncio.run(import_archive(args, processes))
+    print(progress.line())
+    return 1 if progress.counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
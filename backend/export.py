@@ -0,0 +1,132 @@
+import io
+import csv
+import json
+
+# ---------------------------------------------------------
+# Report export encoders
+# ---------------------------------------------------------
+# Each encoder turns an iterator of pages (lists of report dicts) into an
+# iterator of byte chunks, one or more per page, so an export of any size
+# is streamed with only one page in memory.
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXTENSIONS = {"ndjson": ".ndjson", "csv": ".csv", "parquet": ".parquet"}
+
+# Fixed columns for the tabular formats; NDJSON carries every field.
+COLUMNS = (
+    "image_hash",
+    "tracking_id",
+    "created_at",
+    "updated_at",
+    "status",
+    "type",
+    "severity",
+    "urgency",
+    "explanation",
+    "latitude",
+    "longitude",
+    "geohash",
+    "gps",
+    "image",
+    "thumbnail",
+    "phash",
+    "user_id",
+    "email",
+    "analyzed_at",
+    "prefilter_confidence",
+)
+FLOAT_COLUMNS = ("latitude", "longitude", "prefilter_confidence")
+
+
+def _cell(value, column: str):
+    if value is None:
+        return None
+    if column in FLOAT_COLUMNS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def ndjson_chunks(pages):
+    for page in pages:
+        yield "".join(json.dumps(record, default=str) + "\n" for record in page).encode("utf-8")
+
+
+def csv_chunks(pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for page in pages:
+        writer.writerows([_cell(record.get(c), c) for c in COLUMNS] for record in page)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_chunks(pages):
+    """One row group per page; the footer follows the last one."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, pa.float64() if c in FLOAT_COLUMNS else pa.string()) for c in COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for page in pages:
+            columns = {c: [_cell(record.get(c), c) for record in page] for c in COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"ndjson": ndjson_chunks, "csv": csv_chunks, "parquet": parquet_chunks}
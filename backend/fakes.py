@@ -0,0 +1,526 @@
+"""In-memory stand-ins for the GCP clients used by the backend.
+
+Selected with BACKEND=fake (see backends.py) and used by the scripts in
+bench/ so the service can be exercised without live GCP. Only the slice
+of each client API that the backend calls is implemented. Every fake
+takes a per-call ``latency`` and an ``error_rate``: the fraction of calls
+that raise the exception the real client would raise on a transient
+server fault.
+"""
+import json
+import time
+import uuid
+import random
+import threading
+
+from google.api_core import exceptions
+
+
+def _merge_value(old, new):
+    """Apply one field of a merge write: nested maps merge, Increment adds."""
+    if type(new).__name__ == "Increment":
+        return (old if isinstance(old, (int, float)) else 0) + new.value
+    if isinstance(new, dict):
+        merged = dict(old) if isinstance(old, dict) else {}
+        for key, value in new.items():
+            merged[key] = _merge_value(merged.get(key), value)
+        return merged
+    return new
+
+
+def _simulate_call(latency: float, error_rate: float, rng: random.Random, error):
+    if latency:
+        time.sleep(latency)
+    if error_rate and rng.random() < error_rate:
+        raise error("Injected fault")
+
+
+# ---------------------------------------------------------
+# Firestore
+# ---------------------------------------------------------
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str):
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, transaction=None, field_paths=None):
+        if transaction is not None:
+            transaction._lock_document(self.path)
+        self._client._round_trip()
+        data, version = self._client._read(self.path)
+        if data is not None and field_paths:
+            data = {k: v for k, v in data.items() if k in field_paths}
+        return FakeSnapshot(self, data)
+
+    def set(self, data: dict, merge: bool = False):
+        self._client._round_trip()
+        self._client._write(self.path, data, merge=merge)
+
+    def update(self, data: dict):
+        self._client._round_trip()
+        if self._client._read(self.path)[0] is None:
+            raise exceptions.NotFound(f"No document to update: {self.path}")
+        self._client._write(self.path, data, merge=True)
+
+    def delete(self):
+        self._client._round_trip()
+        self._client._delete(self.path)
+
+
+class FakeQuery:
+    OPS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+    }
+
+    def __init__(
+        self, client, path: str, filters=(), orders=(), limit=None, cursor=None, fields=None
+    ):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **kw):
+        args = dict(
+            filters=self._filters,
+            orders=self._orders,
+            limit=self._limit,
+            cursor=self._cursor,
+            fields=self._fields,
+        )
+        args.update(kw)
+        return FakeQuery(self._client, self._path, **args)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        return self._copy(cursor=values)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def _sort_key(self, snap):
+        return tuple(snap.id if field == "__name__" else snap.get(field) for field, _ in self._orders) + (snap.id,)
+
+    def stream(self, transaction=None):
+        self._client._round_trip()
+        snaps = []
+        for path, data in self._client._scan(self._path):
+            if all(self.OPS[op](data.get(f), v) for f, op, v in self._filters):
+                snaps.append(FakeSnapshot(FakeDocumentReference(self._client, path), data))
+
+        descending = any(d == "DESCENDING" for _, d in self._orders)
+        snaps.sort(key=self._sort_key, reverse=descending)
+
+        if self._cursor is not None:
+            if isinstance(self._cursor, FakeSnapshot):
+                # A document cursor also breaks ties on the document id.
+                marker = self._sort_key(self._cursor)
+            elif isinstance(self._cursor, dict):
+                marker = tuple(self._cursor.get(f) for f, _ in self._orders)
+            else:
+                marker = tuple(self._cursor)
+            n = len(marker)
+            if descending:
+                snaps = [s for s in snaps if self._sort_key(s)[:n] < marker]
+            else:
+                snaps = [s for s in snaps if self._sort_key(s)[:n] > marker]
+
+        if self._limit is not None:
+            snaps = snaps[: self._limit]
+        if self._fields is not None:
+            snaps = [
+                FakeSnapshot(s.reference, {k: v for k, v in s._data.items() if k in self._fields})
+                for s in snaps
+            ]
+        yield from snaps
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: str | None = None):
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex}")
+
+
+class FakeTransaction:
+    """Pessimistic transaction, like the server SDKs: reads lock documents until commit."""
+
+    def __init__(self, client, max_attempts: int = 5, lock_timeout: float = 2.0):
+        self._client = client
+        self._max_attempts = max_attempts
+        self._lock_timeout = lock_timeout
+        self._read_only = False
+        self._id = None
+        self._locked: list[str] = []
+        self._writes: list[tuple[str, dict, bool]] = []
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _lock_document(self, path):
+        if path in self._locked:
+            return
+        if not self._client._doc_lock(path).acquire(timeout=self._lock_timeout):
+            self._client.aborts += 1
+            raise exceptions.Aborted(f"Lock timeout on {path}")
+        self._locked.append(path)
+
+    def _clean_up(self):
+        for path in self._locked:
+            self._client._doc_lock(path).release()
+        self._id = None
+        self._locked = []
+        self._writes = []
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        self._client._round_trip()
+        for path, data, merge in self._writes:
+            self._client._write(path, data, merge=merge)
+        self._clean_up()
+        return []
+
+    def get(self, ref):
+        return ref.get(transaction=self)
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref.path, dict(data), merge))
+
+    def update(self, ref, data):
+        self._writes.append((ref.path, dict(data), True))
+
+
+class FakeWriteBatch:
+    """Writes applied together in one round-trip; nothing is applied if any fails."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes: list[tuple[str, str, dict | None, bool]] = []
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref.path, dict(data), False))
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref.path, dict(data), merge))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref.path, dict(data), True))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref.path, None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._client._round_trip()
+        with self._client._lock:
+            for op, path, _, _ in writes:
+                if op == "update" and self._client._read(path)[0] is None:
+                    raise exceptions.NotFound(f"No document to update: {path}")
+                if op == "create" and self._client._read(path)[0] is not None:
+                    raise exceptions.AlreadyExists(f"Document already exists: {path}")
+            for op, path, data, merge in writes:
+                if op == "delete":
+                    self._client._delete(path)
+                else:
+                    self._client._write(path, data, merge=merge)
+        return [None] * len(writes)
+
+
+class FakeFirestore:
+    """Thread-safe in-memory Firestore with optional per-call latency."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.round_trips = 0
+        self.aborts = 0
+        self._docs: dict[str, tuple[dict, int]] = {}
+        self._lock = threading.RLock()
+        self._doc_locks: dict[str, threading.Lock] = {}
+
+    def _doc_lock(self, path) -> threading.Lock:
+        with self._lock:
+            return self._doc_locks.setdefault(path, threading.Lock())
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        _simulate_call(self.latency, self.error_rate, self._rng, exceptions.ServiceUnavailable)
+
+    def _read(self, path):
+        with self._lock:
+            data, version = self._docs.get(path, (None, 0))
+            return (dict(data) if data is not None else None), version
+
+    def _write(self, path, data, merge=False):
+        with self._lock:
+            current, version = self._docs.get(path, (None, 0))
+            new = _merge_value(current if merge else None, data)
+            self._docs[path] = (new, version + 1)
+
+    def _delete(self, path):
+        with self._lock:
+            _, version = self._docs.get(path, (None, 0))
+            self._docs[path] = (None, version + 1)
+
+    def _scan(self, collection_path):
+        with self._lock:
+            items = [
+                (p, dict(d))
+                for p, (d, _) in self._docs.items()
+                if d is not None and p.rsplit("/", 1)[0] == collection_path
+            ]
+        return items
+
+    def collection(self, name: str):
+        return FakeCollection(self, name)
+
+    def document(self, path: str):
+        return FakeDocumentReference(self, path)
+
+    def transaction(self, max_attempts: int = 5, **kwargs):
+        return FakeTransaction(self, max_attempts=max_attempts)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        """All the documents in one round-trip, like ``Client.get_all``."""
+        references = list(references)
+        if transaction is not None:
+            for ref in references:
+                transaction._lock_document(ref.path)
+        self._round_trip()
+        for ref in references:
+            data, _ = self._read(ref.path)
+            if data is not None and field_paths:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            yield FakeSnapshot(ref, data)
+
+
+# ---------------------------------------------------------
+# Cloud Storage
+# ---------------------------------------------------------
+class FakeBlob:
+    def __init__(self, bucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = None
+        self.content_type = None
+
+    def _store(self, data: bytes, size: int, content_type):
+        with self.bucket._lock:
+            self.bucket.uploads += 1
+            self.bucket.bytes_uploaded += size
+            self.bucket.objects[self.name] = data if self.bucket.keep_data else size
+        self.content_type = content_type
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket._round_trip()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._store(data, len(data), content_type)
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, rewind=False):
+        if rewind:
+            file_obj.seek(0)
+        chunk = self.chunk_size or 8 * 1024 * 1024
+        parts, total = [], 0
+        while True:
+            self.bucket._round_trip()
+            data = file_obj.read(chunk)
+            if not data:
+                break
+            total += len(data)
+            if self.bucket.keep_data:
+                parts.append(data)
+        self._store(b"".join(parts), total, content_type)
+
+    def download_as_bytes(self):
+        self.bucket._round_trip()
+        data = self.bucket.objects.get(self.name)
+        if data is None:
+            raise exceptions.NotFound(self.name)
+        if isinstance(data, int):
+            raise ValueError("FakeBucket created with keep_data=False")
+        return data
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def delete(self):
+        self.bucket._round_trip()
+        with self.bucket._lock:
+            self.bucket.objects.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(
+        self, name: str, latency: float = 0.0, keep_data: bool = True, error_rate: float = 0.0, seed=None
+    ):
+        self.name = name
+        self.latency = latency
+        self.keep_data = keep_data
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.objects: dict[str, bytes | int] = {}
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        _simulate_call(self.latency, self.error_rate, self._rng, exceptions.ServiceUnavailable)
+
+    def blob(self, name: str):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    def __init__(
+        self, latency: float = 0.0, keep_data: bool = True, error_rate: float = 0.0, seed: int | None = None
+    ):
+        self.latency = latency
+        self.keep_data = keep_data
+        self.error_rate = error_rate
+        self.seed = seed
+        self._buckets: dict[str, FakeBucket] = {}
+
+    def bucket(self, name: str):
+        if name not in self._buckets:
+            self._buckets[name] = FakeBucket(
+                name, self.latency, self.keep_data, self.error_rate, self.seed
+            )
+        return self._buckets[name]
+
+
+# ---------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Answers like GenerativeModel.generate_content with a canned assessment."""
+
+    model_name = "models/fake-gemini"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+        quota_per_second: float | None = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        # Server-side quota: calls beyond this many in the last second get a 429.
+        self.quota_per_second = quota_per_second
+        self.calls = 0
+        self.images = 0
+        self.throttled = 0
+        self._recent: list[float] = []
+        self._down_until = 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fail_for(self, seconds: float):
+        """Simulate an outage: every call fails with 503 for ``seconds``."""
+        self._down_until = time.monotonic() + seconds
+
+    def generate_content(self, contents=None, generation_config=None, **kwargs):
+        parts = contents[0]["parts"]
+        count = sum(1 for p in parts if "inline_data" in p)
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if now < self._down_until:
+                raise exceptions.ServiceUnavailable("Injected outage")
+            if self.quota_per_second is not None:
+                self._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= self.quota_per_second:
+                    self.throttled += 1
+                    raise exceptions.ResourceExhausted("Quota exceeded")
+                self._recent.append(now)
+            self.images += count
+        # Quota errors are what Gemini returns most under load.
+        _simulate_call(self.latency, self.error_rate, self._rng, exceptions.ResourceExhausted)
+
+        assessment = {
+            "type": "pothole",
+            "severity": 3,
+            "urgency": "medium",
+            "explanation": "Fake assessment.",
+        }
+        if count == 1:
+            return FakeResponse(json.dumps(assessment))
+        return FakeResponse(json.dumps([dict(assessment, index=i) for i in range(count)]))
+
+
+# ---------------------------------------------------------
+# Firebase Auth
+# ---------------------------------------------------------
+class FakeTokenVerifier:
+    """Accepts any non-empty token; the token itself is the user id."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def warm_up(self):
+        pass
+
+    def verify(self, token: str) -> dict:
+        _simulate_call(self.latency, self.error_rate, self._rng, exceptions.ServiceUnavailable)
+        if not token:
+            raise ValueError("empty token")
+        return {"user_id": token, "email": f"{token}@example.com"}
@@ -0,0 +1,142 @@
+import json
+import base64
+import hashlib
+
+# ---------------------------------------------------------
+# Prompts
+# ---------------------------------------------------------
+PROMPT_TEMPLATE = """
+You are a pothole assessment expert. Analyze the road image and return ONLY JSON:
+
+{{
+  "type": "pothole" | "crack" | "rutting" | "no_damage",
+  "severity": 1-5,
+  "urgency": "low" | "medium" | "high",
+  "explanation": "short sentence",
+  "gps": "{latitude}, {longitude}"
+}}
+"""
+
+BATCH_PROMPT_TEMPLATE = """
+You are a pothole assessment expert. You will receive {count} road images,
+each preceded by its label "Image <index>:" with index 0 to {last}.
+Analyze every image independently and return ONLY a JSON array with exactly
+{count} objects, one per image, in index order:
+
+[
+  {{
+    "index": 0,
+    "type": "pothole" | "crack" | "rutting" | "no_damage",
+    "severity": 1-5,
+    "urgency": "low" | "medium" | "high",
+    "explanation": "short sentence",
+    "gps": "{latitude}, {longitude}"
+  }}
+]
+"""
+
+GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "response_mime_type": "application/json",
+}
+
+# Changes whenever a prompt or the generation config is edited; part of
+# the analysis cache key so old answers are never reused for a new prompt.
+PROMPT_HASH = hashlib.sha256(
+    (PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE + json.dumps(GENERATION_CONFIG, sort_keys=True)).encode("utf-8")
+).hexdigest()[:16]
+
+
+class ModelCallError(Exception):
+    """The Gemini request itself failed (network, quota, server error)."""
+
+
+def build_prompt(latitude: float, longitude: float) -> str:
+    return PROMPT_TEMPLATE.format(latitude=latitude, longitude=longitude)
+
+
+def build_batch_prompt(count: int, latitude: float, longitude: float) -> str:
+    return BATCH_PROMPT_TEMPLATE.format(
+        count=count, last=count - 1, latitude=latitude, longitude=longitude
+    )
+
+
+def _inline(image_bytes: bytes, mime_type: str | None) -> dict:
+    return {
+        "inline_data": {
+            "mime_type": mime_type,
+            "data": base64.b64encode(image_bytes).decode("utf-8"),
+        }
+    }
+
+
+def _generate(model, parts: list) -> str:
+    try:
+        response = model.generate_content(
+            contents=[{"role": "user", "parts": parts}],
+            generation_config=GENERATION_CONFIG,
+        )
+        return response.text
+    except Exception as api_err:
+        raise ModelCallError(str(api_err)) from api_err
+
+
+# ---------------------------------------------------------
+# Response parsing
+# ---------------------------------------------------------
+def parse_analysis(text: str) -> dict:
+    try:
+        analysis = json.loads(text)
+        if isinstance(analysis, list) and analysis:
+            analysis = analysis[0]
+        if not isinstance(analysis, dict):
+            raise ValueError("not an object")
+    except Exception:
+        analysis = {"raw": text}
+    return analysis
+
+
+def parse_batch(text: str, count: int) -> list[dict] | None:
+    """Assessments ordered by image index, or None if the array is unusable."""
+    try:
+        items = json.loads(text)
+    except Exception:
+        return None
+    if not isinstance(items, list) or len(items) != count:
+        return None
+    if not all(isinstance(item, dict) for item in items):
+        return None
+
+    if all("index" in item for item in items):
+        by_index = {}
+        for item in items:
+            try:
+                by_index[int(item["index"])] = item
+            except (TypeError, ValueError):
+                return None
+        if sorted(by_index) != list(range(count)):
+            return None
+        items = [by_index[i] for i in range(count)]
+
+    return [{k: v for k, v in item.items() if k != "index"} for item in items]
+
+
+# ---------------------------------------------------------
+# Assessment
+# ---------------------------------------------------------
+def assess(model, image_bytes: bytes, mime_type: str | None, latitude: float, longitude: float) -> dict:
+    parts = [{"text": build_prompt(latitude, longitude)}, _inline(image_bytes, mime_type)]
+    return parse_analysis(_generate(model, parts))
+
+
+def assess_batch(model, images: list[tuple[bytes, str | None]], latitude: float, longitude: float):
+    """Assess several images in one request.
+
+    Returns a list aligned with ``images``, or None if the model's
+    answer was malformed so the caller can fall back to ``assess``.
+    """
+    parts = [{"text": build_batch_prompt(len(images), latitude, longitude)}]
+    for idx, (image_bytes, mime_type) in enumerate(images):
+        parts.append({"text": f"Image {idx}:"})
+        parts.append(_inline(image_bytes, mime_type))
+    return parse_batch(_generate(model, parts), len(images))
@@ -0,0 +1,123 @@
+import math
+
+# ---------------------------------------------------------
+# Geohash
+# ---------------------------------------------------------
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+GEOHASH_PRECISION = 9  # ~4.8m cells; prefixes give every coarser level for free
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def cell_size_degrees(precision: int) -> tuple[float, float]:
+    """(height, width) of a geohash cell in degrees."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def precision_for_radius(latitude: float, radius_m: float) -> int:
+    """Finest precision whose cells are at least ``radius_m`` on each side.
+
+    A circle of that radius then always fits inside the 3x3 block of
+    cells around its centre.
+    """
+    lon_scale = max(math.cos(math.radians(latitude)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        if min(height * METERS_PER_DEGREE, width * METERS_PER_DEGREE * lon_scale) >= radius_m:
+            return precision
+    return 1
+
+
+def covering_prefixes(latitude: float, longitude: float, radius_m: float) -> list[str]:
+    """Geohash prefixes of the cell containing the point and its 8 neighbours."""
+    precision = precision_for_radius(latitude, radius_m)
+    height, width = cell_size_degrees(precision)
+    prefixes = set()
+    for dlat in (-height, 0.0, height):
+        lat = min(max(latitude + dlat, -90.0), 90.0 - 1e-9)
+        for dlon in (-width, 0.0, width):
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            prefixes.add(encode(lat, lon, precision))
+    return sorted(prefixes)
+
+
+# ---------------------------------------------------------
+# Nearby query
+# ---------------------------------------------------------
+def query_nearby(
+    collection,
+    latitude: float,
+    longitude: float,
+    radius_m: float,
+    limit: int | None = None,
+    fields: list[str] | None = None,
+):
+    """Reports within ``radius_m`` metres, nearest first.
+
+    Runs one ``geohash`` range scan per covering prefix and filters the
+    candidates by exact great-circle distance. ``fields`` projects each
+    report to those fields (latitude and longitude are always read).
+    """
+    matches = []
+    for prefix in covering_prefixes(latitude, longitude, radius_m):
+        query = collection.where("geohash", ">=", prefix).where("geohash", "<", prefix + "~")
+        if fields is not None:
+            query = query.select(sorted(set(fields) | {"latitude", "longitude"}))
+        for doc in query.stream():
+            record = doc.to_dict()
+            lat, lon = record.get("latitude"), record.get("longitude")
+            if lat is None or lon is None:
+                continue
+            distance = haversine_m(latitude, longitude, lat, lon)
+            if distance <= radius_m:
+                record["distance_m"] = round(distance, 1)
+                matches.append(record)
+
+    matches.sort(key=lambda r: r["distance_m"])
+    if limit is not None:
+        matches = matches[:limit]
+    return matches
@@ -0,0 +1,124 @@
+import json
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from ttl_cache import TTLCache
+
+# ---------------------------------------------------------
+# Idempotency keys (POST /analyze)
+# ---------------------------------------------------------
+# Keys are scoped per user: one user's key never matches another's request.
+
+# Firestore documents are limited to 1 MiB; larger responses stay local.
+MAX_STORED_BYTES = 900_000
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    content: dict
+    fingerprint: str
+
+
+class FingerprintMismatch(Exception):
+    """The key was already used for a different request."""
+
+
+class IdempotencyStore:
+    """Finished responses by key for ``ttl`` seconds, plus requests still running.
+
+    ``begin`` returns a stored response to replay, or None when the caller
+    owns the key and must ``finish`` (or ``abandon``) it. A request that
+    arrives while the owner is still running on this instance waits for it
+    instead.
+
+    With ``db``, finished responses are also written to ``collection`` (one
+    document per key, ``expires_at`` set for a Firestore TTL policy), so a
+    retry that reaches another instance is replayed too. Requests still
+    running are only known to their own instance.
+    """
+
+    def __init__(self, db=None, collection: str = "idempotency_keys", max_entries: int = 10000, ttl: float = 86400.0):
+        self.db = db
+        self.collection = collection
+        self.ttl = ttl
+        self._responses = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._in_flight: dict[tuple, tuple[str, asyncio.Future]] = {}
+
+    def _ref(self, key: tuple):
+        doc_id = hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return self.db.collection(self.collection).document(doc_id)
+
+    def _load(self, key: tuple) -> tuple[StoredResponse, float] | None:
+        """Stored response and its remaining seconds from Firestore, if any."""
+        snapshot = self._ref(key).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict() or {}
+        expires_at = data.get("expires_at")
+        # TTL deletion runs up to a day late: expired documents may still be read.
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds() if expires_at else 0
+        if remaining <= 0:
+            return None
+        response = StoredResponse(data["status_code"], json.loads(data["content"]), data["fingerprint"])
+        return response, remaining
+
+    def _save(self, key: tuple, response: StoredResponse):
+        content = json.dumps(response.content)
+        if len(content) > MAX_STORED_BYTES:
+            return
+        self._ref(key).set({
+            "status_code": response.status_code,
+            "content": content,
+            "fingerprint": response.fingerprint,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+        })
+
+    async def begin(self, key: tuple, fingerprint: str, wait_timeout: float | None = None):
+        """``(stored response or None, attached)``; attached is True if it waited on a running request."""
+        attached = False
+        while True:
+            stored = self._responses.get(key)
+            if stored is None and key not in self._in_flight and self.db is not None:
+                loaded = await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+                if loaded is not None:
+                    stored, remaining = loaded
+                    self._responses.put(key, stored, ttl=remaining)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    raise FingerprintMismatch()
+                return stored, attached
+            # Another request for the key may have started while Firestore was read.
+            running = self._in_flight.get(key)
+            if running is None:
+                self._in_flight[key] = (fingerprint, asyncio.get_running_loop().create_future())
+                return None, attached
+            running_fingerprint, done = running
+            if running_fingerprint != fingerprint:
+                raise FingerprintMismatch()
+            attached = True
+            # shield: a waiter giving up must not cancel the owner's future.
+            await asyncio.wait_for(asyncio.shield(done), wait_timeout)
+            # Finished (stored) or abandoned (free to take over): look again.
+
+    async def finish(self, key: tuple, response: StoredResponse | None):
+        """Store ``response`` (None: don't, e.g. a transient error) and wake waiters."""
+        if response is not None:
+            self._responses.put(key, response)
+        running = self._in_flight.pop(key, None)
+        if running is not None and not running[1].done():
+            running[1].set_result(None)
+        if response is not None and self.db is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._save, key, response)
+            except Exception as e:
+                # The response was already served; only other instances miss it.
+                print(f"Error storing idempotency key: {e}")
+
+    async def abandon(self, key: tuple):
+        await self.finish(key, None)
+
+    def stats(self) -> dict:
+        return {"stored": len(self._responses), "in_flight": len(self._in_flight)}
@@ -0,0 +1,134 @@
+import io
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+# ---------------------------------------------------------
+# Image normalization
+# ---------------------------------------------------------
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def open_image(source) -> Image.Image:
+    """Open raw bytes or a seekable binary file (e.g. an upload's spool file)."""
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    source.seek(0)
+    return Image.open(source)
+
+
+@dataclass
+class NormalizedImage:
+    model_bytes: bytes
+    model_mime: str
+    thumbnail_bytes: bytes
+    thumbnail_mime: str
+    thumbnail_ext: str
+    width: int
+    height: int
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(out, fmt, quality=quality)
+    return out.getvalue()
+
+
+def normalize(
+    source,
+    content_type: str | None,
+    max_edge: int = 1600,
+    fmt: str = "JPEG",
+    quality: int = 85,
+    thumbnail_edge: int = 320,
+    size: int | None = None,
+) -> NormalizedImage | None:
+    """Rotate per EXIF, downscale and re-encode a model copy plus a thumbnail.
+
+    ``source`` is raw bytes or a seekable file, which Pillow reads lazily;
+    for a file pass its byte ``size``. The original is left untouched (it
+    stays the dedupe key and the archived blob). Returns None if Pillow
+    cannot decode the image.
+    """
+    fmt = fmt.upper()
+    try:
+        img = open_image(source)
+        # JPEG can decode straight to a reduced scale; big win on phone photos.
+        img.draft("RGB", (max_edge, max_edge))
+        # Shrink before rotating/converting so only one full-size decode is held.
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        model_img = ImageOps.exif_transpose(img)
+        if model_img.mode != "RGB":
+            model_img = model_img.convert("RGB")
+
+        model_bytes = _encode(model_img, fmt, quality)
+        model_mime = MIME_TYPES.get(fmt, "image/jpeg")
+
+        # Never send the model something bigger than what was uploaded.
+        if isinstance(source, (bytes, bytearray)):
+            size = len(source)
+        if size is not None and len(model_bytes) >= size and content_type:
+            if isinstance(source, (bytes, bytearray)):
+                model_bytes = bytes(source)
+            else:
+                source.seek(0)
+                model_bytes = source.read()
+            model_mime = content_type
+
+        width, height = model_img.size
+        thumb = model_img.copy()
+        thumb.thumbnail((thumbnail_edge, thumbnail_edge), Image.Resampling.LANCZOS)
+        thumbnail_bytes = _encode(thumb, fmt, quality)
+    except Exception as e:
+        print("Image normalization error:", e)
+        return None
+
+    return NormalizedImage(
+        model_bytes=model_bytes,
+        model_mime=model_mime,
+        thumbnail_bytes=thumbnail_bytes,
+        thumbnail_mime=MIME_TYPES.get(fmt, "image/jpeg"),
+        thumbnail_ext=EXTENSIONS.get(fmt, ".jpg"),
+        width=width,
+        height=height,
+    )
+
+
+# ---------------------------------------------------------
+# EXIF GPS
+# ---------------------------------------------------------
+GPS_IFD = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+
+def _degrees(dms, ref) -> float | None:
+    try:
+        degrees, minutes, seconds = (float(v) for v in dms)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    value = degrees + minutes / 60 + seconds / 3600
+    if isinstance(ref, bytes):
+        ref = ref.decode("ascii", "ignore")
+    return -value if str(ref).strip().upper() in ("S", "W") else value
+
+
+def gps_coordinates(img: Image.Image) -> tuple[float, float] | None:
+    """``(latitude, longitude)`` from the EXIF GPS tags, or None if absent or invalid."""
+    try:
+        gps = img.getexif().get_ifd(GPS_IFD)
+    except Exception:
+        return None
+    if not gps:
+        return None
+    latitude = _degrees(gps.get(GPS_LATITUDE), gps.get(GPS_LATITUDE_REF))
+    longitude = _degrees(gps.get(GPS_LONGITUDE), gps.get(GPS_LONGITUDE_REF))
+    if latitude is None or longitude is None:
+        return None
+    # Cameras without a fix often write zeros.
+    if (latitude, longitude) == (0.0, 0.0) or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
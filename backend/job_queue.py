@@ -0,0 +1,179 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+
+
+# ---------------------------------------------------------
+# Persistent local job queue (SQLite)
+# ---------------------------------------------------------
+class RetryLater(Exception):
+    """Raised by a handler that couldn't start the work (e.g. a dependency is
+    down); the job runs again after ``delay`` seconds without using an attempt."""
+
+    def __init__(self, message: str, delay: float):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobQueue:
+    """Durable FIFO of JSON jobs with retry scheduling.
+
+    Jobs left ``running`` by a crashed process are requeued on open.
+    Failed attempts are retried with jittered exponential backoff until
+    ``max_attempts``, then parked as ``failed``.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5, backoff_base: float = 2.0, backoff_max: float = 300.0):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'queued',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " available_at REAL NOT NULL,"
+                " last_error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at)")
+            self._db.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+            self._db.commit()
+
+    def enqueue(self, payload: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (payload, available_at) VALUES (?, ?)",
+                (json.dumps(payload), time.time()),
+            )
+            self._db.commit()
+        self._wakeup.set()
+
+    def claim(self) -> tuple[int, dict, int] | None:
+        """Next ready job as ``(id, payload, attempts_so_far)``, marked running."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, payload, attempts FROM jobs"
+                " WHERE state = 'queued' AND available_at <= ?"
+                " ORDER BY available_at, id LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET state = 'running' WHERE id = ?", (row[0],))
+            self._db.commit()
+        return row[0], json.loads(row[1]), row[2]
+
+    def complete(self, job_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db.commit()
+
+    def fail(self, job_id: int, error: str) -> bool:
+        """Record a failed attempt. Returns True if the job will be retried."""
+        with self._lock:
+            attempts = self._db.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0] + 1
+            if attempts >= self.max_attempts:
+                self._db.execute(
+                    "UPDATE jobs SET state = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, job_id),
+                )
+                retry = False
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                self._db.execute(
+                    "UPDATE jobs SET state = 'queued', attempts = ?, last_error = ?, available_at = ?"
+                    " WHERE id = ?",
+                    (attempts, error, time.time() + delay, job_id),
+                )
+                retry = True
+            self._db.commit()
+        return retry
+
+    def defer(self, job_id: int, delay: float, error: str):
+        """Put a job back for ``delay`` seconds without counting an attempt."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET state = 'queued', last_error = ?, available_at = ? WHERE id = ?",
+                (error, time.time() + max(1.0, delay), job_id),
+            )
+            self._db.commit()
+
+    def pending_values(self, field: str) -> set:
+        """``payload[field]`` of every job not yet done or failed."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT json_extract(payload, ?) FROM jobs WHERE state IN ('queued', 'running')",
+                (f"$.{field}",),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def wait(self, timeout: float):
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+
+# ---------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------
+class JobWorkerPool:
+    """Fixed number of daemon threads draining a JobQueue.
+
+    ``handler(payload)`` does the work and may raise RetryLater to put the
+    job back without spending an attempt; ``on_give_up(payload, error)``
+    runs once a job has exhausted its attempts.
+    """
+
+    def __init__(self, queue: JobQueue, handler, workers: int = 2, on_give_up=None, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.on_give_up = on_give_up
+        self.poll_interval = poll_interval
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+
+    def start(self):
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.queue._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self.queue.wait(self.poll_interval)
+                continue
+            job_id, payload, _ = job
+            try:
+                self.handler(payload)
+                self.queue.complete(job_id)
+            except RetryLater as e:
+                print(f"Job {job_id} deferred {e.delay:.0f}s:", e)
+                self.queue.defer(job_id, e.delay, str(e))
+            except Exception as e:
+                print(f"Job {job_id} failed:", e)
+                if not self.queue.fail(job_id, str(e)) and self.on_give_up:
+                    try:
+                        self.on_give_up(payload, str(e))
+                    except Exception as give_up_err:
+                        print(f"Job {job_id} give-up handler failed:", give_up_err)
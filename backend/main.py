@@ -1,21 +1,46 @@
 import os
 import json
+import asyncio
+import threading
+import hmac
 import hashlib
+import time
 import base64
-from datetime import datetime
+import uuid
+import contextvars
+import functools
+import mimetypes
+from datetime import datetime, date, timedelta, timezone
+from dataclasses import dataclass
+from contextlib import AsyncExitStack, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from google.api_core import exceptions
 
-from jose import jwt
-import requests
-from google.auth import jwt as google_jwt
-
-# NEW GOOGLE AI SDK
-from google import generativeai as genai
-
-from google.cloud import storage, firestore
+import backends
+from tracking_ids import TrackingIdAllocator
+import phash
+import geo
+import imaging
+import gemini
+import prefilter
+from result_cache import AnalysisCache
+from streaming import ByteBudget, BudgetExceeded, md5_file, file_size
+from ttl_cache import TTLCache
+from job_queue import JobQueue, JobWorkerPool, RetryLater
+import metrics
+from rollups import Rollups
+from tiles import TileIndex, mappable, LOAD_FIELDS as TILE_LOAD_FIELDS
+from bloom import BloomFilter
+from idempotency import IdempotencyStore, StoredResponse, FingerprintMismatch
+import export
+from model_governor import (
+    AdaptiveConcurrency, CircuitBreaker, GovernedModel, ModelGovernor, ModelUnavailable, TokenBucket, RETRYABLE,
+)
 
 # ---------------------------------------------------------
 # FastAPI app + CORS
@@ -28,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
 
 # ---------------------------------------------------------
@@ -40,16 +66,355 @@ FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "pothole-webapp")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-GOOGLE_CERTS_URL = (
-    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+# "gcp" for the real services, "fake" for in-memory stand-ins (benchmarks, CI).
+# The FAKE_* settings only apply to the fakes: per-call latency in ms and
+# the fraction of calls that fail with a transient error.
+BACKEND = os.getenv("BACKEND", "gcp").lower()
+FAKE_FIRESTORE_LATENCY_MS = float(os.getenv("FAKE_FIRESTORE_LATENCY_MS", "0"))
+FAKE_STORAGE_LATENCY_MS = float(os.getenv("FAKE_STORAGE_LATENCY_MS", "0"))
+FAKE_MODEL_LATENCY_MS = float(os.getenv("FAKE_MODEL_LATENCY_MS", "0"))
+FAKE_AUTH_LATENCY_MS = float(os.getenv("FAKE_AUTH_LATENCY_MS", "0"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+FAKE_SEED = int(os.environ["FAKE_SEED"]) if os.getenv("FAKE_SEED") else None
+
+GOOGLE_CERTS_URL = os.getenv(
+    "GOOGLE_CERTS_URL",
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com",
+)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Images processed at once within one /analyze request (1 = sequential),
+# and blocking pipeline threads shared by all requests in this process.
+ANALYZE_CONCURRENCY = max(1, int(os.getenv("ANALYZE_CONCURRENCY", "4")))
+ANALYZE_WORKERS = max(1, int(os.getenv("ANALYZE_WORKERS", "16")))
+
+TRACKING_BLOCK_SIZE = int(os.getenv("TRACKING_BLOCK_SIZE", "100"))
+TRACKING_SHARDS = int(os.getenv("TRACKING_SHARDS", "1"))
+TRACKING_DAILY_RESET = os.getenv("TRACKING_DAILY_RESET", "false").lower() in ("1", "true", "yes")
+
+# Near-duplicate dedupe: max dHash Hamming distance (negative disables),
+# and size of the lat/lon cells the index is partitioned by. The index is
+# saved to PHASH_SNAPSHOT_BLOB in the bucket (at most every
+# PHASH_SNAPSHOT_SECONDS) and refreshed with the Bloom filter below.
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_CELL_DEGREES = float(os.getenv("PHASH_CELL_DEGREES", "0.01"))
+PHASH_SNAPSHOT_BLOB = os.getenv("PHASH_SNAPSHOT_BLOB", "indexes/near_duplicates.bin")
+PHASH_SNAPSHOT_SECONDS = float(os.getenv("PHASH_SNAPSHOT_SECONDS", "3600"))
+
+# GET /nearby: largest radius (metres) and number of reports per query.
+NEARBY_MAX_RADIUS_M = float(os.getenv("NEARBY_MAX_RADIUS_M", "5000"))
+NEARBY_MAX_LIMIT = int(os.getenv("NEARBY_MAX_LIMIT", "500"))
+
+# Dashboard rollups: geohash precision of a cell (5 = ~4.9 km), counter
+# shards per cell and day, and the limits of one GET /stats query.
+ROLLUP_PRECISION = int(os.getenv("ROLLUP_PRECISION", "5"))
+ROLLUP_SHARDS = int(os.getenv("ROLLUP_SHARDS", "4"))
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "92"))
+STATS_MAX_CELLS = int(os.getenv("STATS_MAX_CELLS", "9"))
+
+# Bloom filter of known image hashes: a definite miss skips the exact-dedupe
+# read. Sized for BLOOM_CAPACITY hashes at a BLOOM_ERROR_RATE false-positive
+# rate. It is persisted to BLOOM_SNAPSHOT_BLOB in the bucket; every
+# BLOOM_REFRESH_SECONDS it (and the near-duplicate index) folds in reports
+# written by other instances.
+BLOOM_ENABLED = os.getenv("BLOOM_ENABLED", "true").lower() in ("1", "true", "yes")
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.01"))
+BLOOM_SNAPSHOT_BLOB = os.getenv("BLOOM_SNAPSHOT_BLOB", "indexes/known_hashes.bloom")
+BLOOM_REFRESH_SECONDS = float(os.getenv("BLOOM_REFRESH_SECONDS", "300"))
+
+# Map tiles: deepest zoom served, 2**TILE_BIN_BITS clusters per tile side,
+# and how many rendered tiles to keep.
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "15"))
+TILE_BIN_BITS = int(os.getenv("TILE_BIN_BITS", "3"))
+TILE_CACHE_ENTRIES = int(os.getenv("TILE_CACHE_ENTRIES", "4096"))
+# Every TILE_REFRESH_SECONDS the index folds in reports other instances
+# wrote. It is saved to TILE_SNAPSHOT_BLOB in the bucket (at most every
+# TILE_SNAPSHOT_SECONDS).
+TILE_REFRESH_SECONDS = float(os.getenv("TILE_REFRESH_SECONDS", "60"))
+TILE_SNAPSHOT_BLOB = os.getenv("TILE_SNAPSHOT_BLOB", "indexes/tiles.bin")
+TILE_SNAPSHOT_SECONDS = float(os.getenv("TILE_SNAPSHOT_SECONDS", "3600"))
+# Startup restores the three report indexes (Bloom filter, near-duplicate,
+# tiles) from their snapshots and reads only the reports written since.
+# Indexes without a usable snapshot (an empty *_SNAPSHOT_BLOB: never saved)
+# share one read of every report instead of one each.
+
+# POST /analyze?mode=async: local SQLite job queue, worker threads, attempts.
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "/tmp/pothole_jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Jobs live on the instance that accepted the upload. Every JOB_SWEEP_SECONDS
+# (and at startup) reports still waiting for analysis that nobody touched
+# for JOB_STALE_SECONDS are claimed and queued here, so a replaced instance
+# doesn't strand them. 0 sweeps only at startup.
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", "300"))
+
+# POST /analyze with an Idempotency-Key header: finished responses are kept
+# IDEMPOTENCY_TTL seconds (up to IDEMPOTENCY_MAX_KEYS keys); a retry of a
+# request still running waits up to IDEMPOTENCY_WAIT_TIMEOUT seconds for it.
+# Finished responses are also stored in IDEMPOTENCY_COLLECTION so retries
+# that reach another instance are replayed; give it a TTL policy on the
+# expires_at field. An empty IDEMPOTENCY_COLLECTION keeps keys in-process.
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "300"))
+IDEMPOTENCY_COLLECTION = os.getenv("IDEMPOTENCY_COLLECTION", "idempotency_keys")
+
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "5"))
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+
+MYREPORTS_DEFAULT_LIMIT = int(os.getenv("MYREPORTS_DEFAULT_LIMIT", "50"))
+MYREPORTS_MAX_LIMIT = int(os.getenv("MYREPORTS_MAX_LIMIT", "500"))
+
+# GET /export: documents per Firestore page (one page in memory at a time),
+# and the uids or emails allowed to export besides users whose Firebase
+# token carries the custom claim export=true.
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_USERS = {u.strip() for u in os.getenv("EXPORT_USERS", "").split(",") if u.strip()}
+
+# Model copy of each upload: longest edge in px (0 sends the original),
+# re-encode format (JPEG or WEBP) and quality; thumbnail longest edge.
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+THUMBNAIL_EDGE = int(os.getenv("THUMBNAIL_EDGE", "320"))
+
+# New images sent to Gemini per request (1 = one call per image), and the
+# most image bytes per request: inline requests are capped at 20 MB and
+# base64 adds a third. A larger image still goes, on its own.
+GEMINI_BATCH_SIZE = max(1, int(os.getenv("GEMINI_BATCH_SIZE", "5")))
+GEMINI_BATCH_MAX_BYTES = int(os.getenv("GEMINI_BATCH_MAX_BYTES", str(12 * 1024 * 1024)))
+
+# Local CPU prefilter before Gemini: "off", "shadow" (score and count only)
+# or "enforce" (images scoring below a threshold get a local "rejected" or
+# "no_damage" assessment instead of a model call). Tune the thresholds with
+# bench/tune_prefilter.py.
+PREFILTER_MODE = os.getenv("PREFILTER_MODE", "off").lower()
+PREFILTER_REJECT_BELOW = float(os.getenv("PREFILTER_REJECT_BELOW", "0.2"))
+PREFILTER_NO_DAMAGE_BELOW = float(os.getenv("PREFILTER_NO_DAMAGE_BELOW", "0.1"))
+
+# Gemini call governor: token bucket sized to the quota (requests/minute and
+# burst), AIMD concurrency bounds, retries with jittered exponential backoff,
+# and a circuit breaker (consecutive outage errors to open, seconds until a
+# trial call). While the circuit is open, sync /analyze either fails fast
+# with 503 ("fail") or accepts the upload as an async job ("queue").
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "600"))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "20"))
+GEMINI_MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_INITIAL_CONCURRENCY = int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_RETRY_BASE = float(os.getenv("GEMINI_RETRY_BASE", "0.5"))
+GEMINI_RETRY_MAX = float(os.getenv("GEMINI_RETRY_MAX", "8"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "30"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+GEMINI_OPEN_FALLBACK = os.getenv("GEMINI_OPEN_FALLBACK", "fail").lower()
+# Threads for model calls, apart from the pipeline threads: a call waiting
+# for quota or a retry backoff doesn't hold up other requests' hashing,
+# dedupe reads and uploads.
+MODEL_WORKERS = max(1, int(os.getenv("MODEL_WORKERS", str(GEMINI_MAX_CONCURRENCY))))
+
+# Gemini result cache: in-memory LRU size, TTL in seconds, optional SQLite file.
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 86400)))
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH") or None
+
+# Streaming uploads: hash and upload from the request's spool file in
+# chunks instead of reading whole images into memory. In-flight image
+# bytes per process are capped; requests queue up to the timeout, then 503.
+UPLOAD_STREAMING = os.getenv("UPLOAD_STREAMING", "true").lower() in ("1", "true", "yes")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))  # multiple of 256 KiB
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "10"))
+
+# Prometheus metrics at GET /metrics (stage timings, counters, cache stats),
+# and a trace id per request (X-Request-ID, generated if absent) added to
+# the JSON log lines and echoed in the response.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_LOGGING = os.getenv("TRACE_LOGGING", "false").lower() in ("1", "true", "yes")
+
+# Run the GET /_warmup steps in the background at startup as well.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+# GET /_warmup reads Firestore and Storage, so callers (the startup probe:
+# set it as an httpHeaders entry) must send it in X-Warmup-Token. Unset, the
+# endpoint is disabled.
+WARMUP_TOKEN = os.getenv("WARMUP_TOKEN", "")
+
+# ---------------------------------------------------------
+# Service backends (Firestore, Storage, Gemini, Firebase Auth)
+# ---------------------------------------------------------
+if BACKEND == "fake":
+    services = backends.fake_backends(backends.FakeSettings(
+        firestore_latency=FAKE_FIRESTORE_LATENCY_MS / 1000,
+        storage_latency=FAKE_STORAGE_LATENCY_MS / 1000,
+        model_latency=FAKE_MODEL_LATENCY_MS / 1000,
+        auth_latency=FAKE_AUTH_LATENCY_MS / 1000,
+        error_rate=FAKE_ERROR_RATE,
+        seed=FAKE_SEED,
+    ))
+elif BACKEND == "gcp":
+    services = backends.gcp_backends(
+        project=PROJECT_ID,
+        database=FIRESTORE_DB_ID,
+        gemini_api_key=GEMINI_API_KEY,
+        certs_url=GOOGLE_CERTS_URL,
+        token_cache_size=TOKEN_CACHE_SIZE,
+        audience=FIREBASE_PROJECT_ID,
+    )
+else:
+    raise RuntimeError(f"Unknown BACKEND {BACKEND!r}; expected 'gcp' or 'fake'")
+
+# Lazy: each client (and its SDK) is created on first use, not at import,
+# which keeps cold starts short. GET /_warmup creates them ahead of traffic.
+db = services.db
+storage_client = services.storage
+bucket = backends.Lazy(lambda: storage_client.bucket(POTHOLE_BUCKET))
+
+analysis_cache = AnalysisCache(
+    max_entries=ANALYSIS_CACHE_SIZE,
+    ttl=ANALYSIS_CACHE_TTL,
+    sqlite_path=ANALYSIS_CACHE_PATH,
+)
+
+upload_budget = ByteBudget(UPLOAD_MAX_INFLIGHT_BYTES)
+
+status_cache = TTLCache(max_entries=STATUS_CACHE_SIZE, ttl=STATUS_CACHE_TTL)
+
+idempotency_store = IdempotencyStore(
+    db if IDEMPOTENCY_COLLECTION else None,
+    collection=IDEMPOTENCY_COLLECTION,
+    max_entries=IDEMPOTENCY_MAX_KEYS,
+    ttl=IDEMPOTENCY_TTL,
 )
 
+image_executor = ThreadPoolExecutor(max_workers=ANALYZE_WORKERS, thread_name_prefix="analyze")
+model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+
 # ---------------------------------------------------------
-# Firestore + Storage clients
+# Metrics + trace ids
 # ---------------------------------------------------------
-db = firestore.Client(project=PROJECT_ID, database=FIRESTORE_DB_ID)
-storage_client = storage.Client()
-bucket = storage_client.bucket(POTHOLE_BUCKET)
+registry = metrics.Registry()
+stage_seconds = registry.histogram(
+    "pothole_stage_seconds", "Time spent in each /analyze pipeline stage.", ("stage",)
+)
+request_seconds = registry.histogram(
+    "pothole_http_request_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+image_bytes = registry.histogram(
+    "pothole_image_bytes",
+    "Size of uploaded originals and of the copies sent to Gemini.",
+    ("kind",),
+    buckets=metrics.BYTE_BUCKETS,
+)
+dedupe_hits = registry.counter(
+    "pothole_dedupe_hits_total", "Images answered from an existing record.", ("kind",)
+)
+idempotent_requests = registry.counter(
+    "pothole_idempotent_requests_total",
+    "POST /analyze requests with an Idempotency-Key (replayed/attached: served without redoing the work).",
+    ("result",),
+)
+model_errors = registry.counter("pothole_model_errors_total", "Gemini requests that failed.")
+prefilter_results = registry.counter(
+    "pothole_prefilter_total", "Images scored by the local prefilter, by verdict.", ("verdict",)
+)
+prefilter_confidence = registry.histogram(
+    "pothole_prefilter_confidence",
+    "Prefilter confidence by outcome (screened locally, or Gemini's answer: damage / no_damage / raw).",
+    ("outcome",),
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+model_calls_skipped = registry.counter(
+    "pothole_model_calls_skipped_total", "Gemini calls replaced by a local prefilter assessment.", ("verdict",)
+)
+parse_fallbacks = registry.counter(
+    "pothole_model_parse_fallbacks_total",
+    "Gemini answers that were not the expected JSON (batch: retried per image; raw: stored as text).",
+    ("kind",),
+)
+registry.gauge(
+    "pothole_analysis_cache", "Gemini result cache counters and size.", analysis_cache.stats, labelname="stat"
+)
+registry.gauge(
+    "pothole_status_cache",
+    "GET /status cache counters and size.",
+    lambda: {"hits": status_cache.hits, "misses": status_cache.misses, "entries": len(status_cache)},
+    labelname="stat",
+)
+registry.gauge(
+    "pothole_idempotency_keys",
+    "Idempotency keys with a stored /analyze response, and requests still running.",
+    idempotency_store.stats,
+    labelname="stat",
+)
+registry.gauge(
+    "pothole_upload_bytes_in_flight", "Image bytes currently reserved by requests.", lambda: upload_budget.in_use
+)
+registry.gauge(
+    "pothole_jobs", "Async analysis jobs by state.", lambda: job_queue.counts() if job_queue else {}, labelname="state"
+)
+
+current_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+
+
+def stage(name: str):
+    """``with stage("upload"): ...`` records the block in pothole_stage_seconds."""
+    return stage_seconds.time(stage=name) if METRICS_ENABLED else nullcontext()
+
+
+def log_event(event: str, **fields):
+    trace_id = current_trace_id.get()
+    if trace_id:
+        fields = {"trace_id": trace_id, **fields}
+    print(json.dumps({"event": event, **fields}))
+
+
+class ObservabilityMiddleware:
+    """Per-route request timings and the request's trace id (plain ASGI, no body buffering)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (METRICS_ENABLED or TRACE_LOGGING):
+            return await self.app(scope, receive, send)
+
+        trace_id = None
+        if TRACE_LOGGING:
+            for name, value in scope["headers"]:
+                if name == b"x-request-id":
+                    trace_id = value.decode("latin-1")[:128]
+                    break
+            trace_id = trace_id or uuid.uuid4().hex
+        token = current_trace_id.set(trace_id)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace_id:
+                    message["headers"] = [*message.get("headers", []), (b"x-request-id", trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            current_trace_id.reset(token)
+            if METRICS_ENABLED:
+                route = scope.get("route")
+                request_seconds.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=getattr(route, "path", "unmatched"),
+                    status=status,
+                )
+
+
+app.add_middleware(ObservabilityMiddleware)
 
 # ---------------------------------------------------------
 # MD5 helper
@@ -58,26 +423,351 @@ def md5_bytes(data: bytes) -> str:
     return hashlib.md5(data).hexdigest()
 
 # ---------------------------------------------------------
-# Firebase Token Verification
+# Near-duplicate index (perceptual hash)
 # ---------------------------------------------------------
-def verify_firebase_token(token: str):
-    """Validate Firebase ID token using Google public keys."""
+near_dup_index = phash.NearDuplicateIndex(cell_degrees=PHASH_CELL_DEGREES)
+
+
+def save_near_dup_index():
     try:
-        certs = requests.get(GOOGLE_CERTS_URL).json()
-        header = jwt.get_unverified_header(token)
-        kid = header["kid"]
+        bucket.blob(PHASH_SNAPSHOT_BLOB).upload_from_string(
+            near_dup_index.to_bytes(watermark=known_watermark),
+            content_type="application/octet-stream",
+        )
+    except Exception as e:
+        print("Near-duplicate snapshot save error:", e)
 
-        if kid not in certs:
-            print("❌ Invalid key ID")
-            return None
 
-        public_key = certs[kid]
-        decoded = google_jwt.decode(
-            token,
-            public_key,
-            audience=FIREBASE_PROJECT_ID,
+def restore_near_dup_index() -> str | None:
+    """The restored snapshot's watermark, or None without a usable snapshot."""
+    if not PHASH_SNAPSHOT_BLOB:
+        return None
+    try:
+        header = near_dup_index.restore(bucket.blob(PHASH_SNAPSHOT_BLOB).download_as_bytes())
+        return header.get("watermark") or ""
+    except Exception as e:
+        print("Near-duplicate snapshot not used:", e)
+        return None
+
+# ---------------------------------------------------------
+# Known image hashes (Bloom filter)
+# ---------------------------------------------------------
+known_hashes = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+known_hashes_ready = threading.Event()
+# Newest created_at folded into the Bloom filter and the near-duplicate index.
+known_watermark = ""
+# A report is stamped created_at before its batch commits, so catch-up
+# queries start this far before the watermark.
+BLOOM_CATCHUP_OVERLAP = timedelta(minutes=2)
+
+bloom_lookups = registry.counter(
+    "pothole_bloom_lookups_total",
+    "Exact-dedupe checks by Bloom filter outcome (skipped: Firestore read saved).",
+    ("result",),
+)
+registry.gauge(
+    "pothole_bloom",
+    "Known-hash Bloom filter size, fill and readiness.",
+    lambda: {
+        "keys": len(known_hashes),
+        "bits": known_hashes.bits,
+        "hashes": known_hashes.hashes,
+        "estimated_error_rate": known_hashes.estimated_error_rate(),
+        "ready": int(known_hashes_ready.is_set()),
+    },
+    labelname="stat",
+)
+
+
+def may_exist(image_hash: str) -> bool:
+    """False only when no report with this hash has been written (per the Bloom filter)."""
+    if not (BLOOM_ENABLED and known_hashes_ready.is_set()):
+        return True
+    if image_hash in known_hashes:
+        return True
+    bloom_lookups.inc(result="skipped")
+    return False
+
+
+def add_known_report(doc_id: str, data: dict) -> bool:
+    """Add a stored report to the Bloom filter and the near-duplicate index; True if either was missing it."""
+    added = BLOOM_ENABLED and known_hashes.add(doc_id)
+    if PHASH_MAX_DISTANCE >= 0:
+        added = near_dup_index.add_record(doc_id, data) or added
+    return bool(added)
+
+
+def fold_in_reports(since: str) -> tuple[int, str]:
+    """Add reports created after ``since`` (all if empty); returns (new reports, newest created_at)."""
+    query = db.collection("pothole_reports")
+    if since:
+        created = datetime.fromisoformat(since.removesuffix("Z")) - BLOOM_CATCHUP_OVERLAP
+        query = query.where("created_at", ">", created.isoformat() + "Z")
+    fields = ["created_at"] + (phash.LOAD_FIELDS if PHASH_MAX_DISTANCE >= 0 else [])
+    added, newest = 0, since
+    for doc in query.select(fields).stream():
+        data = doc.to_dict() or {}
+        added += add_known_report(doc.id, data)
+        newest = max(newest, data.get("created_at") or "")
+    return added, newest
+
+
+def save_known_hashes():
+    try:
+        bucket.blob(BLOOM_SNAPSHOT_BLOB).upload_from_string(
+            known_hashes.to_bytes(watermark=known_watermark),
+            content_type="application/octet-stream",
         )
-        return decoded
+    except Exception as e:
+        print("Bloom snapshot save error:", e)
+
+
+def restore_known_hashes() -> str | None:
+    """The restored snapshot's watermark, or None without a usable snapshot."""
+    if not BLOOM_SNAPSHOT_BLOB:
+        return None
+    try:
+        snapshot, header = BloomFilter.from_bytes(bucket.blob(BLOOM_SNAPSHOT_BLOB).download_as_bytes())
+        known_hashes.union(snapshot)
+        return header.get("watermark") or ""
+    except Exception as e:
+        print("Bloom snapshot not used:", e)
+        return None
+
+
+def save_known_reports(near_dups: bool = True):
+    if BLOOM_ENABLED and BLOOM_SNAPSHOT_BLOB:
+        save_known_hashes()
+    if near_dups and PHASH_MAX_DISTANCE >= 0 and PHASH_SNAPSHOT_BLOB:
+        save_near_dup_index()
+
+
+def refresh_known_reports():
+    """Fold in other instances' reports every BLOOM_REFRESH_SECONDS."""
+    global known_watermark
+    saved_at = time.monotonic()
+    while BLOOM_REFRESH_SECONDS > 0:
+        time.sleep(BLOOM_REFRESH_SECONDS)
+        try:
+            added, known_watermark = fold_in_reports(known_watermark)
+            if added:
+                # The near-duplicate snapshot is the larger one: saved less often.
+                near_dups = time.monotonic() - saved_at >= PHASH_SNAPSHOT_SECONDS
+                save_known_reports(near_dups=near_dups)
+                if near_dups:
+                    saved_at = time.monotonic()
+        except Exception as e:
+            print("Known report refresh error:", e)
+
+# ---------------------------------------------------------
+# Map tile index
+# ---------------------------------------------------------
+tile_index = TileIndex(max_zoom=TILE_MAX_ZOOM, bin_bits=TILE_BIN_BITS, cache_entries=TILE_CACHE_ENTRIES)
+registry.gauge(
+    "pothole_tiles",
+    "Map tile index size and rendered-tile cache counters.",
+    lambda: {
+        "cells": tile_index.cells(),
+        "cache_entries": len(tile_index.cache),
+        "cache_hits": tile_index.cache.hits,
+        "cache_misses": tile_index.cache.misses,
+    },
+    labelname="stat",
+)
+
+
+# Reports are counted once, by updated_at: the index holds every report
+# updated before tile_watermark, plus the ones this instance wrote itself.
+# A report is stamped updated_at before its write commits, so the
+# watermark trails the clock by TILE_SETTLE and never passes a write that
+# could still land behind it.
+TILE_SETTLE = timedelta(minutes=2)
+tile_watermark = ""
+# image_hash -> updated_at of reports this instance added at or after the
+# watermark; the catch-up that reaches them skips them.
+tile_own_writes: dict[str, str] = {}
+tile_own_writes_lock = threading.Lock()
+
+
+def add_to_tiles(record: dict):
+    """Count a report this instance just wrote (by the same rule as other instances' writes)."""
+    if not mappable(record):
+        return
+    with tile_own_writes_lock:
+        if TILE_REFRESH_SECONDS > 0:
+            tile_own_writes[record["image_hash"]] = record.get("updated_at") or ""
+        tile_index.add(record["latitude"], record["longitude"], record.get("severity"))
+
+
+def settled_time() -> str:
+    return (datetime.utcnow() - TILE_SETTLE).isoformat(timespec="microseconds") + "Z"
+
+
+def fold_in_tiles(since: str, until: str) -> int:
+    """Add reports updated in [since, until) that this instance didn't count itself."""
+    query = (
+        db.collection("pothole_reports")
+        .where("updated_at", ">=", since)
+        .where("updated_at", "<", until)
+        .select(["latitude", "longitude", "severity", "explanation"])
+    )
+    added = 0
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        if not mappable(data):
+            continue
+        with tile_own_writes_lock:
+            if doc.id in tile_own_writes:
+                continue
+            tile_index.add(data["latitude"], data["longitude"], data.get("severity"))
+        added += 1
+    with tile_own_writes_lock:
+        for image_hash in [h for h, updated in tile_own_writes.items() if updated < until]:
+            del tile_own_writes[image_hash]
+    return added
+
+
+def save_tile_index():
+    try:
+        with tile_own_writes_lock:
+            data = tile_index.to_bytes(watermark=tile_watermark, own_writes=tile_own_writes)
+        bucket.blob(TILE_SNAPSHOT_BLOB).upload_from_string(data, content_type="application/octet-stream")
+    except Exception as e:
+        print("Tile snapshot save error:", e)
+
+
+def restore_tile_index() -> bool:
+    """Restore the snapshot and its watermark; False without a usable snapshot."""
+    global tile_watermark
+    if not TILE_SNAPSHOT_BLOB:
+        return False
+    try:
+        header = tile_index.restore(bucket.blob(TILE_SNAPSHOT_BLOB).download_as_bytes())
+        with tile_own_writes_lock:
+            tile_own_writes.update(header.get("own_writes") or {})
+        tile_watermark = header["watermark"]
+        return True
+    except Exception as e:
+        print("Tile snapshot not used:", e)
+        return False
+
+
+def refresh_tiles():
+    """Fold in other instances' reports every TILE_REFRESH_SECONDS."""
+    global tile_watermark
+    saved_at = time.monotonic()
+    while TILE_REFRESH_SECONDS > 0:
+        time.sleep(TILE_REFRESH_SECONDS)
+        try:
+            until = settled_time()
+            added = fold_in_tiles(tile_watermark, until)
+            tile_watermark = until
+            if TILE_SNAPSHOT_BLOB and added and time.monotonic() - saved_at >= TILE_SNAPSHOT_SECONDS:
+                save_tile_index()
+                saved_at = time.monotonic()
+        except Exception as e:
+            print("Tile index refresh error:", e)
+
+# ---------------------------------------------------------
+# Report indexes: startup load
+# ---------------------------------------------------------
+def scan_reports(known: bool, tiles: bool, until: str) -> int:
+    """One read of every report, feeding the indexes that had no snapshot.
+
+    ``known``: the Bloom filter and the near-duplicate index (adding a
+    report they already hold is harmless). ``tiles``: the tile index, with
+    the reports updated before ``until``.
+    """
+    global known_watermark
+    fields = set()
+    if known:
+        fields.add("created_at")
+        if PHASH_MAX_DISTANCE >= 0:
+            fields.update(phash.LOAD_FIELDS)
+    if tiles:
+        fields.update(TILE_LOAD_FIELDS)
+
+    count, newest, pending = 0, "", []
+    for doc in db.collection("pothole_reports").select(sorted(fields)).stream():
+        data = doc.to_dict() or {}
+        count += 1
+        if known:
+            add_known_report(doc.id, data)
+            newest = max(newest, data.get("created_at") or "")
+        if tiles and mappable(data) and (data.get("updated_at") or "") < until:
+            pending.append((data["latitude"], data["longitude"], data.get("severity")))
+            if len(pending) >= 5000:
+                tile_index.add_all(pending)
+    if tiles:
+        tile_index.add_all(pending)
+    if known:
+        known_watermark = newest
+    return count
+
+
+def load_report_indexes():
+    """Restore the Bloom filter, near-duplicate and tile indexes, then catch them up.
+
+    Indexes whose snapshot is missing share one ``scan_reports``; the
+    others only read reports written after their snapshot's watermark.
+    """
+    global known_watermark, tile_watermark
+    known = BLOOM_ENABLED or PHASH_MAX_DISTANCE >= 0
+    try:
+        watermarks = []
+        if BLOOM_ENABLED:
+            watermarks.append(restore_known_hashes())
+        if PHASH_MAX_DISTANCE >= 0:
+            watermarks.append(restore_near_dup_index())
+        scan_known = None in watermarks
+        tiles_restored = restore_tile_index()
+
+        until = settled_time()
+        scanned = 0
+        if scan_known or not tiles_restored:
+            scanned = scan_reports(scan_known, not tiles_restored, until)
+
+        added = 0
+        if known:
+            since = known_watermark if scan_known else min(watermarks)
+            added, known_watermark = fold_in_reports(since)
+            known_hashes_ready.set()
+        tile_added = fold_in_tiles(tile_watermark, until) if tiles_restored else 0
+        tile_watermark = until
+
+        print(
+            f"Report indexes loaded: {scanned} reports scanned, {added + tile_added} caught up; "
+            f"{len(known_hashes)} known hashes, {len(near_dup_index)} near-duplicate hashes, "
+            f"{tile_index.cells()} tile cells"
+        )
+        if scan_known or added:
+            save_known_reports()
+        if TILE_SNAPSHOT_BLOB and (not tiles_restored or tile_added):
+            save_tile_index()
+    except Exception as e:
+        # Not ready: every dedupe check keeps reading Firestore.
+        print("Report index load error:", e)
+        return
+
+    if known:
+        threading.Thread(target=refresh_known_reports, daemon=True).start()
+    refresh_tiles()
+
+
+@app.on_event("startup")
+def start_report_indexes():
+    # Loaded in the background so startup isn't blocked by Firestore reads;
+    # until then dedupe checks read Firestore and lookups see fewer candidates.
+    threading.Thread(target=load_report_indexes, daemon=True).start()
+
+# ---------------------------------------------------------
+# Firebase Token Verification
+# ---------------------------------------------------------
+def verify_firebase_token(token: str):
+    """Validate Firebase ID token using cached Google public keys."""
+    try:
+        with stage("auth"):
+            return services.token_verifier.verify(token)
     except Exception as e:
         print("Token verification error:", e)
         return None
@@ -86,29 +776,748 @@ def verify_firebase_token(token: str):
 # ---------------------------------------------------------
 # Gemini Client (NEW SDK)
 # ---------------------------------------------------------
+model_governor = ModelGovernor(
+    TokenBucket(rate=GEMINI_RPM / 60, burst=GEMINI_BURST),
+    AdaptiveConcurrency(
+        GEMINI_INITIAL_CONCURRENCY, minimum=GEMINI_MIN_CONCURRENCY, maximum=GEMINI_MAX_CONCURRENCY
+    ),
+    CircuitBreaker(threshold=GEMINI_BREAKER_THRESHOLD, reset_timeout=GEMINI_BREAKER_RESET),
+    max_retries=GEMINI_MAX_RETRIES,
+    backoff_base=GEMINI_RETRY_BASE,
+    backoff_max=GEMINI_RETRY_MAX,
+    queue_timeout=GEMINI_QUEUE_TIMEOUT,
+)
+registry.gauge(
+    "pothole_gemini_governor",
+    "Gemini limiter state: call/retry/overload/rejection counts, free tokens, concurrency and circuit.",
+    model_governor.stats,
+    labelname="stat",
+)
+
+
 def get_gemini_model():
-    if not GEMINI_API_KEY:
-        raise RuntimeError("❌ GEMINI_API_KEY not set")
-    genai.configure(api_key=GEMINI_API_KEY)
-    return genai.GenerativeModel("gemini-2.5-flash")
+    # One configured model per process, built on first use; every call
+    # goes through the shared governor.
+    return GovernedModel(services.model.get(), model_governor)
 
 
+# ---------------------------------------------------------
+# Dashboard rollups
+# ---------------------------------------------------------
+rollups = Rollups(db, precision=ROLLUP_PRECISION, shards=ROLLUP_SHARDS)
+
 # ---------------------------------------------------------
 # Tracking ID generator
 # ---------------------------------------------------------
+tracking_ids = TrackingIdAllocator(
+    db,
+    block_size=TRACKING_BLOCK_SIZE,
+    shards=TRACKING_SHARDS,
+    daily_reset=TRACKING_DAILY_RESET,
+)
+
+
 def generate_tracking_id():
-    date_part = datetime.utcnow().strftime("%Y%m%d")
-    counter_ref = db.collection("system").document("tracking_counter")
-    counter_doc = counter_ref.get()
+    with stage("tracking_id"):
+        return tracking_ids.next_id()
+
+
+# ---------------------------------------------------------
+# Per-image pipeline
+# ---------------------------------------------------------
+class ImageProcessingError(Exception):
+    """Raised from a pipeline worker; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+    def response(self) -> JSONResponse:
+        headers = None
+        if self.retry_after is not None:
+            headers = {"Retry-After": str(max(1, round(self.retry_after)))}
+        return JSONResponse(status_code=self.status_code, content={"error": self.message}, headers=headers)
 
-    if not counter_doc.exists:
-        counter_ref.set({"value": 1})
-        counter = 1
+
+@dataclass
+class PreparedImage:
+    """A new (non-deduped) image, uploaded and ready for assessment."""
+
+    image_hash: str
+    original_bytes: int
+    model_bytes: bytes
+    model_mime: str | None
+    blob_name: str
+    gcs_uri: str
+    thumbnail_uri: str | None
+    perceptual_hash: int | None
+    normalize_ms: float
+
+
+def make_model_copy(source, content_type: str | None, blob_name: str, size: int | None = None):
+    """Downscaled copy for Gemini plus a stored thumbnail.
+
+    Returns ``(model_bytes, model_mime, thumbnail_uri, normalize_ms)``;
+    falls back to the original bytes if the image can't be decoded.
+    """
+    normalize_start = time.perf_counter()
+    normalized = None
+    if IMAGE_MAX_EDGE > 0:
+        normalized = imaging.normalize(
+            source,
+            content_type,
+            max_edge=IMAGE_MAX_EDGE,
+            fmt=IMAGE_FORMAT,
+            quality=IMAGE_QUALITY,
+            thumbnail_edge=THUMBNAIL_EDGE,
+            size=size,
+        )
+    normalize_ms = (time.perf_counter() - normalize_start) * 1000
+    if METRICS_ENABLED:
+        stage_seconds.observe(normalize_ms / 1000, stage="normalize")
+
+    thumbnail_uri = None
+    if normalized:
+        model_bytes, model_mime = normalized.model_bytes, normalized.model_mime
+        thumb_name = f"thumbnails/{os.path.splitext(blob_name)[0]}{normalized.thumbnail_ext}"
+        with stage("thumbnail_upload"):
+            bucket.blob(thumb_name).upload_from_string(
+                normalized.thumbnail_bytes, content_type=normalized.thumbnail_mime
+            )
+        thumbnail_uri = f"gs://{POTHOLE_BUCKET}/{thumb_name}"
     else:
-        counter = counter_doc.to_dict().get("value", 1) + 1
-        counter_ref.update({"value": counter})
+        if not isinstance(source, bytes):
+            source.seek(0)
+            source = source.read()
+        model_bytes, model_mime = source, content_type
+
+    image_bytes.observe(len(model_bytes), kind="model")
+    return model_bytes, model_mime, thumbnail_uri, normalize_ms
+
+
+def prepare_image(
+    source,
+    size: int,
+    image_hash: str,
+    filename: str | None,
+    content_type: str | None,
+    latitude: float,
+    longitude: float,
+    normalize: bool = True,
+) -> dict | PreparedImage:
+    """Near-dedupe, upload and normalize one image. Blocking; runs in image_executor.
+
+    ``source`` is the image bytes, or in streaming mode the upload's
+    seekable spool file. Exact duplicates were already looked up for the
+    whole request by ``lookup_existing``. Returns the existing record for
+    a near duplicate, else a PreparedImage. With ``normalize=False``
+    (async submissions) the model copy is left for the job worker to build.
+    """
+
+    image_bytes.observe(size, kind="original")
+
+    # --- Near-duplicate dedupe ---
+    perceptual_hash = None
+    if PHASH_MAX_DISTANCE >= 0:
+        with stage("phash"):
+            perceptual_hash = phash.dhash(source)
+
+    if perceptual_hash is not None:
+        match = near_dup_index.find(perceptual_hash, latitude, longitude, PHASH_MAX_DISTANCE)
+        if match:
+            distance, match_id = match
+            with stage("dedupe_get"):
+                match_snapshot = db.collection("pothole_reports").document(match_id).get()
+            if match_snapshot.exists:
+                dedupe_hits.inc(kind="near")
+                existing = match_snapshot.to_dict()
+                existing["deduped"] = True
+                existing["phash_distance"] = distance
+                return existing
+
+    # --- Upload to Cloud Storage ---
+    _, ext = os.path.splitext(filename or "")
+    if not ext:
+        ext = ".jpg"
+
+    # A fresh name per attempt: the same photo from the same spot may already
+    # back a report (or be in flight in another request), and a failed
+    # attempt's cleanup must only ever remove what it uploaded itself.
+    blob_name = f"pothole_{latitude}_{longitude}_{image_hash}_{uuid.uuid4().hex[:12]}{ext}"
+    blob = bucket.blob(blob_name)
+    with stage("upload"):
+        if isinstance(source, bytes):
+            blob.upload_from_string(source, content_type=content_type)
+        else:
+            # Setting chunk_size makes this a resumable upload sent chunk by chunk.
+            blob.chunk_size = UPLOAD_CHUNK_SIZE
+            source.seek(0)
+            blob.upload_from_file(source, content_type=content_type, size=size, rewind=True)
+
+    gcs_uri = f"gs://{POTHOLE_BUCKET}/{blob_name}"
+
+    # --- Normalize: model copy + thumbnail ---
+    if normalize:
+        model_bytes, model_mime, thumbnail_uri, normalize_ms = make_model_copy(
+            source, content_type, blob_name, size
+        )
+    else:
+        model_bytes, model_mime, thumbnail_uri, normalize_ms = b"", content_type, None, 0.0
+
+    return PreparedImage(
+        image_hash=image_hash,
+        original_bytes=size,
+        model_bytes=model_bytes,
+        model_mime=model_mime,
+        blob_name=blob_name,
+        gcs_uri=gcs_uri,
+        thumbnail_uri=thumbnail_uri,
+        perceptual_hash=perceptual_hash,
+        normalize_ms=normalize_ms,
+    )
+
+
+def model_batches(items: list[PreparedImage]) -> list[list[PreparedImage]]:
+    """``items`` split into Gemini requests of at most GEMINI_BATCH_SIZE images and GEMINI_BATCH_MAX_BYTES."""
+    batches, size = [], 0
+    for item in items:
+        n = len(item.model_bytes)
+        if batches and len(batches[-1]) < GEMINI_BATCH_SIZE and size + n <= GEMINI_BATCH_MAX_BYTES:
+            batches[-1].append(item)
+            size += n
+        else:
+            batches.append([item])
+            size = n
+    return batches
+
+
+def assess_batch(model, items: list[PreparedImage], latitude: float, longitude: float) -> list[dict]:
+    """One batched Gemini request for ``items``, else one request per image.
+
+    Falls back to per-image calls when the batched answer is malformed or
+    the batch itself is rejected (a bad request, e.g. one image Gemini
+    can't take); outages and overload still fail the whole batch.
+    """
+    fresh = None
+    if len(items) > 1:
+        try:
+            fresh = gemini.assess_batch(
+                model, [(i.model_bytes, i.model_mime) for i in items], latitude, longitude
+            )
+            if fresh is None:
+                parse_fallbacks.inc(kind="batch")
+                print(f"Gemini batch of {len(items)} malformed; falling back to per-image calls")
+        except gemini.ModelCallError as api_err:
+            if isinstance(api_err.__cause__, (ModelUnavailable, *RETRYABLE)):
+                raise
+            model_errors.inc()
+            print(f"Gemini rejected a batch of {len(items)} ({api_err}); falling back to per-image calls")
+    if fresh is None:
+        fresh = [gemini.assess(model, i.model_bytes, i.model_mime, latitude, longitude) for i in items]
+    return fresh
+
+
+def assess_images(model, items: list[PreparedImage], latitude: float, longitude: float) -> list[dict]:
+    """Gemini assessment for a batch of prepared images, in order.
+
+    Cached answers are reused and images the prefilter screens out get
+    a local assessment; the rest go out in as few requests as
+    ``model_batches`` allows (see ``assess_batch`` for the fallbacks).
+    """
+    model_name = getattr(model, "model_name", "gemini")
+    keys = [AnalysisCache.key(i.image_hash, model_name, gemini.PROMPT_HASH) for i in items]
+    analyses = [analysis_cache.get(k) for k in keys]
+    misses = [idx for idx, a in enumerate(analyses) if a is None]
+    screened = set()
+    confidences = {}
+
+    if PREFILTER_MODE in ("shadow", "enforce"):
+        for idx in misses:
+            with stage("prefilter"):
+                result = prefilter.check(
+                    items[idx].model_bytes, PREFILTER_REJECT_BELOW, PREFILTER_NO_DAMAGE_BELOW
+                )
+            if result is None:
+                continue  # undecodable here; let Gemini judge it
+            prefilter_results.inc(verdict=result.verdict)
+            confidences[idx] = result.confidence
+            if result.verdict != "pass" and PREFILTER_MODE == "enforce":
+                model_calls_skipped.inc(verdict=result.verdict)
+                analyses[idx] = prefilter.local_assessment(result, latitude, longitude)
+                screened.add(idx)
+        misses = [idx for idx in misses if idx not in screened]
+
+    model_start = time.perf_counter()
+    try:
+        fresh = []
+        for batch in model_batches([items[i] for i in misses]):
+            fresh.extend(assess_batch(model, batch, latitude, longitude))
+    except gemini.ModelCallError as api_err:
+        model_errors.inc()
+        if isinstance(api_err.__cause__, ModelUnavailable):
+            raise ImageProcessingError(
+                503, f"Gemini unavailable: {api_err}", retry_after=api_err.__cause__.retry_after
+            )
+        raise ImageProcessingError(502, f"Gemini 2.5 Error: {api_err}")
+    model_ms = (time.perf_counter() - model_start) * 1000
+    if misses and METRICS_ENABLED:
+        stage_seconds.observe(model_ms / 1000, stage="model")
+
+    for idx, analysis in zip(misses, fresh):
+        analyses[idx] = analysis
+        if "raw" in analysis:
+            parse_fallbacks.inc(kind="raw")
+        else:
+            # gps echoes the request location, so it isn't part of the cached answer.
+            analysis_cache.put(keys[idx], {k: v for k, v in analysis.items() if k != "gps"})
+
+    # Stored with the report (not cached) so thresholds can be tuned against Gemini's answers.
+    for idx, confidence in confidences.items():
+        analysis = analyses[idx]
+        if idx in screened:
+            outcome = "screened"
+        elif "raw" in analysis:
+            outcome = "raw"
+        else:
+            outcome = "no_damage" if analysis.get("type") == "no_damage" else "damage"
+        prefilter_confidence.observe(confidence, outcome=outcome)
+        analyses[idx] = {**analysis, "prefilter_confidence": round(confidence, 3)}
+
+    for idx, item in enumerate(items):
+        log_event(
+            "image_preprocess",
+            image_hash=item.image_hash,
+            original_bytes=item.original_bytes,
+            model_bytes=len(item.model_bytes),
+            bytes_saved=item.original_bytes - len(item.model_bytes),
+            normalize_ms=round(item.normalize_ms, 1),
+            model_latency_ms=round(model_ms, 1),
+            batch_size=len(misses),
+            cache="prefilter" if idx in screened else "miss" if idx in misses else "hit",
+            prefilter_confidence=confidences.get(idx),
+        )
+
+    return analyses
+
+
+def lookup_existing(image_hashes: list[str], use_bloom: bool = True) -> dict[str, dict]:
+    """Existing records for ``image_hashes``, fetched with one ``get_all``.
+
+    Hashes the Bloom filter has never seen are not read at all.
+    """
+    checked = use_bloom and BLOOM_ENABLED and known_hashes_ready.is_set()
+    if use_bloom:
+        image_hashes = [h for h in image_hashes if may_exist(h)]
+    if not image_hashes:
+        return {}
+    refs = [db.collection("pothole_reports").document(h) for h in image_hashes]
+    with stage("dedupe_get"):
+        found = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+    if checked:
+        for image_hash in image_hashes:
+            bloom_lookups.inc(result="hit" if image_hash in found else "false_positive")
+    return found
+
+
+def discard_uploads(items: list[PreparedImage]):
+    """Best-effort removal of the blobs of images whose records were never written.
+
+    Blob names are unique per upload attempt, so this never touches an
+    object another report points to.
+    """
+    for item in items:
+        names = [item.blob_name]
+        if item.thumbnail_uri:
+            names.append(item.thumbnail_uri.removeprefix(f"gs://{POTHOLE_BUCKET}/"))
+        for name in names:
+            try:
+                bucket.blob(name).delete()
+            except Exception as e:
+                print(f"Orphan blob cleanup error ({name}):", e)
+
+
+def build_record(
+    item: PreparedImage,
+    analysis: dict,
+    latitude: float,
+    longitude: float,
+    user_id: str | None,
+    email: str | None,
+    deferred: bool = False,
+) -> dict:
+    tracking_id = generate_tracking_id()
+
+    # --- Build Firestore record ---
+    now = datetime.utcnow().isoformat() + "Z"
+    record = {
+        "type": analysis.get("type"),
+        "severity": analysis.get("severity"),
+        "urgency": analysis.get("urgency"),
+        "explanation": analysis.get("explanation"),
+        "gps": analysis.get("gps") or f"{latitude}, {longitude}",
+        "latitude": latitude,
+        "longitude": longitude,
+        "geohash": geo.encode(latitude, longitude),
+        "image": item.gcs_uri,
+        "thumbnail": item.thumbnail_uri,
+        "image_hash": item.image_hash,
+        "phash": phash.to_hex(item.perceptual_hash) if item.perceptual_hash is not None else None,
+        "prefilter_confidence": analysis.get("prefilter_confidence"),
+        "created_at": now,
+        "updated_at": now,
+        "user_id": user_id,
+        "email": email,
+        "deduped": False,
+        "tracking_id": tracking_id,
+        "status": "submitted",
+    }
+    if deferred:
+        # Set (to null) only on reports waiting for a job: what the stale-job sweep queries.
+        record["analyzed_at"] = None
+
+    return record
+
+
+# Firestore allows 500 writes per batch; each image writes up to three
+# documents (report, tracking_index pointer, rollup shard).
+STORE_BATCH_IMAGES = 160
+
+
+def write_records(records: list[dict], rollup: bool):
+    batch = db.batch()
+    for record in records:
+        # create, not set: a report that already exists is never overwritten.
+        batch.create(db.collection("pothole_reports").document(record["image_hash"]), record)
+        # create as well: a reissued tracking ID must fail, not repoint another report.
+        batch.create(
+            db.collection("tracking_index").document(record["tracking_id"]),
+            {"report_id": record["image_hash"]},
+        )
+        if rollup:
+            rollups.add(batch, record)
+    batch.commit()
+
+
+def commit_records(items: list[PreparedImage], records: list[dict], rollup: bool = True) -> list[dict]:
+    """Write reports, their tracking_index pointers and rollup increments in one WriteBatch.
+
+    Either every document of a batch is written or none is, so a failed
+    write never leaves a report without its pointer (or vice versa), and
+    the dashboard counts never drift from the reports. Records that are
+    not assessed yet (async submissions) are counted by the job worker.
+
+    Returns the records as stored. If a report for one of the images
+    appeared since the dedupe check (a concurrent upload, or a write by
+    another instance the Bloom filter hasn't seen yet), that image gets
+    the existing record, marked deduped, and its uploads are removed.
+    """
+    stored = {}
+    try:
+        with stage("store"):
+            for start in range(0, len(records), STORE_BATCH_IMAGES):
+                chunk = records[start:start + STORE_BATCH_IMAGES]
+                try:
+                    write_records(chunk, rollup)
+                except exceptions.AlreadyExists:
+                    existing = lookup_existing([r["image_hash"] for r in chunk], use_bloom=False)
+                    for image_hash, record in existing.items():
+                        dedupe_hits.inc(kind="exact")
+                        stored[image_hash] = {**record, "deduped": True}
+                    if not existing:
+                        raise  # the tracking_index pointer exists, not the report
+                    chunk = [r for r in chunk if r["image_hash"] not in existing]
+                    if chunk:
+                        write_records(chunk, rollup)
+    except Exception as db_err:
+        raise ImageProcessingError(500, f"Firestore write failed: {db_err}")
+
+    for item, record in zip(items, records):
+        existing = stored.get(item.image_hash)
+        if existing is not None:
+            if existing.get("image") != item.gcs_uri:
+                discard_uploads([item])
+            continue
+        known_hashes.add(item.image_hash)
+        if item.perceptual_hash is not None:
+            near_dup_index.add(item.perceptual_hash, record["latitude"], record["longitude"], item.image_hash)
+        if rollup:
+            add_to_tiles(record)
+    return [stored.get(r["image_hash"], r) for r in records]
+
+
+def store_records(
+    items: list[PreparedImage],
+    analyses: list[dict],
+    latitude: float,
+    longitude: float,
+    user_id: str | None,
+    email: str | None,
+    rollup: bool = True,
+) -> list[dict]:
+    records = [
+        build_record(item, analysis, latitude, longitude, user_id, email, deferred=not rollup)
+        for item, analysis in zip(items, analyses)
+    ]
+    return commit_records(items, records, rollup)
+
+
+async def run_in(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the request's trace id into the worker thread.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_in_pipeline(func, *args, **kwargs):
+    return await run_in(image_executor, func, *args, **kwargs)
+
+
+async def run_model_call(func, *args, **kwargs):
+    return await run_in(model_executor, func, *args, **kwargs)
+
+
+def raise_first_error(outcomes):
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+
+
+@dataclass
+class ImageInput:
+    """One image to analyze: raw bytes or a seekable binary file."""
+
+    source: object
+    size: int
+    filename: str | None
+    content_type: str | None
+
+
+async def image_inputs(images: list[UploadFile]) -> list[ImageInput]:
+    if UPLOAD_STREAMING:
+        # Starlette has already spooled each part (to disk past 1 MB).
+        return [
+            ImageInput(
+                image.file,
+                image.size if image.size is not None else file_size(image.file),
+                image.filename,
+                image.content_type,
+            )
+            for image in images
+        ]
+    inputs = []
+    for image in images:
+        data = await image.read()
+        inputs.append(ImageInput(data, len(data), image.filename, image.content_type))
+    return inputs
+
+
+def hash_input(item: ImageInput) -> str:
+    with stage("hash"):
+        if isinstance(item.source, bytes):
+            return md5_bytes(item.source)
+        return md5_file(item.source)
+
+
+async def run_analysis(
+    inputs: list[ImageInput],
+    latitude: float,
+    longitude: float,
+    user_id: str | None,
+    email: str | None,
+    model,
+    defer_assessment: bool = False,
+    hashes: list[str] | None = None,
+) -> list[dict]:
+    """Full pipeline for one request; results keep the order of ``inputs``.
+
+    With ``defer_assessment`` new images are stored as ``submitted``
+    records and queued for the background workers instead of going to
+    Gemini now. Callers that already hashed the inputs (bulk import)
+    pass the MD5s in ``hashes``.
+    """
+
+    # ---------------- HASH ----------------
+    if hashes is None:
+        hashes = await asyncio.gather(*(run_in_pipeline(hash_input, item) for item in inputs))
+
+    # Identical files in one request are processed once.
+    first_index: dict[str, int] = {}
+    for idx, image_hash in enumerate(hashes):
+        first_index.setdefault(image_hash, idx)
+    unique = list(first_index.values())
+
+    limit = asyncio.Semaphore(ANALYZE_CONCURRENCY)
 
-    return f"PTH-{date_part}-{str(counter).zfill(6)}"
+    async def limited(func, *args, **kwargs):
+        async with limit:
+            return await run_in_pipeline(func, *args, **kwargs)
+
+    # ---------------- DEDUPE (one get_all) ----------------
+    existing = await run_in_pipeline(lookup_existing, [hashes[i] for i in unique])
+    by_hash = {}
+    for image_hash, record in existing.items():
+        dedupe_hits.inc(kind="exact")
+        by_hash[image_hash] = {**record, "deduped": True}
+    fresh = [i for i in unique if hashes[i] not in existing]
+
+    # ---------------- NEAR-DEDUPE + UPLOAD ----------------
+    prepared = await asyncio.gather(
+        *(
+            limited(
+                prepare_image,
+                inputs[i].source,
+                inputs[i].size,
+                hashes[i],
+                inputs[i].filename,
+                inputs[i].content_type,
+                latitude,
+                longitude,
+                normalize=not defer_assessment,
+            )
+            for i in fresh
+        ),
+        return_exceptions=True,
+    )
+    pending = [p for p in prepared if isinstance(p, PreparedImage)]
+
+    try:
+        raise_first_error(prepared)
+
+        # ---------------- GEMINI (batched) ----------------
+        if defer_assessment:
+            analyses = [{} for _ in pending]
+        else:
+            batches = model_batches(pending)
+            assessed = await asyncio.gather(
+                *(run_model_call(assess_images, model, batch, latitude, longitude) for batch in batches),
+                return_exceptions=True,
+            )
+            raise_first_error(assessed)
+            analyses = [a for batch in assessed for a in batch]
+
+        # ---------------- STORE (one WriteBatch) ----------------
+        records = []
+        if pending:
+            records = await run_in_pipeline(
+                store_records, pending, analyses, latitude, longitude, user_id, email,
+                rollup=not defer_assessment,
+            )
+    except BaseException:
+        # Nothing of this request was written; don't leave its blobs behind.
+        if pending:
+            await run_in_pipeline(discard_uploads, pending)
+        raise
+    new_records = {r["image_hash"]: r for r in records}
+
+    if defer_assessment:
+        for item in pending:
+            record = new_records[item.image_hash]
+            if record.get("deduped"):
+                continue
+            job_queue.enqueue({
+                "image_hash": item.image_hash,
+                "tracking_id": record["tracking_id"],
+                "blob_name": item.blob_name,
+                "content_type": item.model_mime,
+                "original_bytes": item.original_bytes,
+                "latitude": latitude,
+                "longitude": longitude,
+                "created_at": record["created_at"],
+            })
+
+    for i, outcome in zip(fresh, prepared):
+        if isinstance(outcome, PreparedImage):
+            outcome = new_records[outcome.image_hash]
+        by_hash[hashes[i]] = outcome
+
+    results = []
+    for idx, image_hash in enumerate(hashes):
+        record = by_hash[image_hash]
+        if first_index[image_hash] != idx:
+            dedupe_hits.inc(kind="request")
+            record = {**record, "deduped": True}
+        results.append(record)
+    return results
+
+
+async def stream_analysis(
+    inputs: list[ImageInput],
+    latitude: float,
+    longitude: float,
+    user_id: str | None,
+    email: str | None,
+    model,
+):
+    """Like ``run_analysis`` but yields ``(index, record, error)`` per image
+    as soon as that image is stored, in completion order.
+
+    Each image goes through prepare -> Gemini -> store on its own, so one
+    slow or failing image neither delays nor fails the others. ``error`` is
+    ``(status_code, message)`` when that image failed.
+    """
+    hashes = await asyncio.gather(*(run_in_pipeline(hash_input, item) for item in inputs))
+
+    copies: dict[str, list[int]] = {}
+    for idx, image_hash in enumerate(hashes):
+        copies.setdefault(image_hash, []).append(idx)
+
+    limit = asyncio.Semaphore(ANALYZE_CONCURRENCY)
+
+    async def limited(func, *args, **kwargs):
+        async with limit:
+            return await run_in_pipeline(func, *args, **kwargs)
+
+    existing = await run_in_pipeline(lookup_existing, list(copies))
+
+    async def one(image_hash: str, idx: int):
+        if image_hash in existing:
+            dedupe_hits.inc(kind="exact")
+            return image_hash, {**existing[image_hash], "deduped": True}, None
+
+        item = inputs[idx]
+        prepared = None
+        try:
+            outcome = await limited(
+                prepare_image,
+                item.source, item.size, image_hash, item.filename, item.content_type,
+                latitude, longitude,
+            )
+            if isinstance(outcome, PreparedImage):
+                prepared = outcome
+                analysis = (await run_model_call(assess_images, model, [prepared], latitude, longitude))[0]
+                outcome = (await limited(
+                    store_records, [prepared], [analysis], latitude, longitude, user_id, email
+                ))[0]
+            return image_hash, outcome, None
+        except Exception as e:
+            if prepared is not None:
+                await run_in_pipeline(discard_uploads, [prepared])
+            if isinstance(e, ImageProcessingError):
+                return image_hash, None, (e.status_code, e.message)
+            return image_hash, None, (500, f"SERVER ERROR: {e}")
+
+    tasks = [asyncio.ensure_future(one(h, positions[0])) for h, positions in copies.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            image_hash, record, error = await next_done
+            for n, idx in enumerate(copies[image_hash]):
+                if record is not None and n > 0:
+                    dedupe_hits.inc(kind="request")
+                    yield idx, {**record, "deduped": True}, None
+                else:
+                    yield idx, record, error
+    finally:
+        # Client went away mid-stream: don't keep spending Gemini calls.
+        for task in tasks:
+            task.cancel()
+
+
+def stream_event(fmt: str, event: dict) -> str:
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
 
 
 # ---------------------------------------------------------
@@ -120,141 +1529,449 @@ async def analyze(
     images: list[UploadFile] = File(...),
     latitude: float = Form(...),
     longitude: float = Form(...),
+    mode: str = "sync",
+    stream: str | None = None,
 ):
     try:
+        if mode not in ("sync", "async"):
+            raise HTTPException(status_code=400, detail="mode must be 'sync' or 'async'")
+        if stream not in (None, "ndjson", "sse"):
+            raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'sse'")
+        if stream and mode == "async":
+            raise HTTPException(status_code=400, detail="stream is only supported with mode=sync")
+
         # ---------------- AUTH ----------------
         id_token = request.headers.get("x-user-token")
         if not id_token:
             raise HTTPException(status_code=401, detail="Missing token")
 
-        decoded = verify_firebase_token(id_token)
+        # Off the event loop: a cert fetch or first RSA check of a token blocks.
+        decoded = await run_in_threadpool(verify_firebase_token, id_token)
         if not decoded:
             raise HTTPException(status_code=401, detail="Invalid Firebase ID token")
 
         user_id = decoded.get("user_id")
         email = decoded.get("email")
 
-        model = get_gemini_model()
+        idempotency_key = request.headers.get("idempotency-key")
+        if idempotency_key and stream:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is not supported with stream")
 
-        results = []
+        if stream:
+            analysis_mode(mode, stream)
+            model = get_gemini_model()
+            total_bytes = sum(upload_size(image) for image in images)
+            return await analyze_streaming(
+                stream, images, total_bytes, latitude, longitude, user_id, email, model
+            )
 
-        # ---------------- PROCESS IMAGES ----------------
-        for image in images:
-            img_bytes = await image.read()
-            image_hash = md5_bytes(img_bytes)
+        if not idempotency_key:
+            return await analyze_upload(images, latitude, longitude, mode, user_id, email)
+        if len(idempotency_key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is longer than 255 characters")
 
-            # --- Firestore dedupe ---
-            doc_ref = db.collection("pothole_reports").document(image_hash)
-            snapshot = doc_ref.get()
+        key = (user_id, idempotency_key)
+        fingerprint = request_fingerprint(images, latitude, longitude, mode)
+        try:
+            stored, attached = await idempotency_store.begin(key, fingerprint, IDEMPOTENCY_WAIT_TIMEOUT)
+        except FingerprintMismatch:
+            idempotent_requests.inc(result="mismatch")
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used for a different request"
+            )
+        except asyncio.TimeoutError:
+            return JSONResponse(
+                status_code=409,
+                content={"error": "A request with this Idempotency-Key is still running"},
+                headers={"Retry-After": "5"},
+            )
+        if stored is not None:
+            idempotent_requests.inc(result="attached" if attached else "replayed")
+            return JSONResponse(
+                status_code=stored.status_code,
+                content=stored.content,
+                headers={"Idempotent-Replayed": "true"},
+            )
 
-            if snapshot.exists:
-                existing = snapshot.to_dict()
-                existing["deduped"] = True
-                results.append(existing)
-                continue
+        idempotent_requests.inc(result="new")
+        response = None
+        try:
+            response = await analyze_upload(images, latitude, longitude, mode, user_id, email)
+        finally:
+            # Server errors and overload are worth retrying for real; keep the rest.
+            if response is not None and response.status_code < 500:
+                await idempotency_store.finish(
+                    key, StoredResponse(response.status_code, json.loads(response.body), fingerprint)
+                )
+            else:
+                await idempotency_store.abandon(key)
+        return response
 
-            # --- Upload to Cloud Storage ---
-            _, ext = os.path.splitext(image.filename or "")
-            if not ext:
-                ext = ".jpg"
+    except HTTPException:
+        raise
+    except BudgetExceeded as e:
+        return busy_response(e)
+    except ImageProcessingError as e:
+        return e.response()
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {e}"})
 
-            blob_name = f"pothole_{latitude}_{longitude}_{image_hash}{ext}"
-            blob = bucket.blob(blob_name)
-            blob.upload_from_string(img_bytes, content_type=image.content_type)
 
-            gcs_uri = f"gs://{POTHOLE_BUCKET}/{blob_name}"
+def upload_size(image: UploadFile) -> int:
+    return image.size if image.size is not None else file_size(image.file)
 
-            # -------------- GEMINI 2.5 FLASH --------------
-            prompt_text = f"""
-You are a pothole assessment expert. Analyze the road image and return ONLY JSON:
 
-{{
-  "type": "pothole" | "crack" | "rutting" | "no_damage",
-  "severity": 1-5,
-  "urgency": "low" | "medium" | "high",
-  "explanation": "short sentence",
-  "gps": "{latitude}, {longitude}"
-}}
-"""
-            image_base64 = base64.b64encode(img_bytes).decode("utf-8")
+def request_fingerprint(images: list[UploadFile], latitude: float, longitude: float, mode: str) -> str:
+    """What a retry must repeat to reuse an Idempotency-Key (file names and sizes, not contents)."""
+    parts = [mode, latitude, longitude] + [[image.filename, upload_size(image)] for image in images]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
 
-            try:
-                response = model.generate_content(
-                    contents=[
-                        {
-                            "role": "user",
-                            "parts": [
-                                {"text": prompt_text},
-                                {
-                                    "inline_data": {
-                                        "mime_type": image.content_type,
-                                        "data": image_base64,
-                                    }
-                                },
-                            ],
-                        }
-                    ],
-                    generation_config={
-                        "temperature": 0.2,
-                        "response_mime_type": "application/json",
-                    },
-                )
-            except Exception as api_err:
-                return JSONResponse(
-                    status_code=502,
-                    content={"error": f"Gemini 2.5 Error: {api_err}"},
-                )
 
-            # --- Parse JSON ---
-            try:
-                analysis = json.loads(response.text)
-                if isinstance(analysis, list) and analysis:
-                    analysis = analysis[0]
-            except Exception:
-                analysis = {"raw": response.text}
-
-            tracking_id = generate_tracking_id()
-
-            # --- Build Firestore record ---
-            record = {
-                "type": analysis.get("type"),
-                "severity": analysis.get("severity"),
-                "urgency": analysis.get("urgency"),
-                "explanation": analysis.get("explanation"),
-                "gps": analysis.get("gps") or f"{latitude}, {longitude}",
-                "latitude": latitude,
-                "longitude": longitude,
-                "image": gcs_uri,
-                "image_hash": image_hash,
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "user_id": user_id,
-                "email": email,
-                "deduped": False,
-                "tracking_id": tracking_id,
-                "status": "submitted",
-            }
+def analysis_mode(mode: str, stream: str | None) -> str:
+    """``mode``, or async while Gemini's circuit is open and queueing is allowed; else 503."""
+    if mode == "sync" and model_governor.breaker.is_open():
+        if GEMINI_OPEN_FALLBACK == "queue" and not stream:
+            # Accept the upload now; the job workers analyze it once Gemini recovers.
+            return "async"
+        raise ImageProcessingError(
+            503, "Gemini unavailable: circuit open", retry_after=model_governor.breaker.retry_after()
+        )
+    return mode
 
-            try:
-                doc_ref.set(record)
-            except Exception as db_err:
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": f"Firestore write failed: {db_err}"},
-                )
 
-            results.append(record)
+async def analyze_upload(
+    images: list[UploadFile],
+    latitude: float,
+    longitude: float,
+    mode: str,
+    user_id: str | None,
+    email: str | None,
+) -> JSONResponse:
+    """Non-streaming /analyze after auth; every outcome is a response, so it can be stored."""
+    try:
+        mode = analysis_mode(mode, None)
+        model = get_gemini_model() if mode == "sync" else None
 
-        return {"results": results}
+        # ---------------- MEMORY BUDGET ----------------
+        total_bytes = sum(upload_size(image) for image in images)
+        async with upload_budget.reserve(total_bytes, UPLOAD_QUEUE_TIMEOUT):
+            inputs = await image_inputs(images)
+            results = await run_analysis(
+                inputs, latitude, longitude, user_id, email, model,
+                defer_assessment=(mode == "async"),
+            )
 
-    except HTTPException:
-        raise
+        if mode == "async":
+            # Poll /status/{tracking_id}: submitted -> analyzing -> analyzed.
+            return JSONResponse(status_code=202, content={"results": results})
+        return JSONResponse(status_code=200, content={"results": results})
+
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+    except BudgetExceeded as e:
+        return busy_response(e)
+    except ImageProcessingError as e:
+        return e.response()
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {e}"})
 
 
+def busy_response(e: BudgetExceeded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": f"Server busy, retry shortly ({e})"},
+        headers={"Retry-After": str(max(1, int(UPLOAD_QUEUE_TIMEOUT)))},
+    )
+
+
+class HeldStreamingResponse(StreamingResponse):
+    """A StreamingResponse that closes ``held`` however it ends.
+
+    The body generator's own ``finally`` doesn't run if the client is
+    gone before the first chunk (the generator never starts), and
+    Starlette skips background tasks on a disconnect.
+    """
+
+    def __init__(self, content, held: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.held = held
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.held.aclose()
+
+
+async def analyze_streaming(fmt, images, total_bytes, latitude, longitude, user_id, email, model):
+    """POST /analyze?stream=ndjson|sse: one event per image, then a summary.
+
+    The upload budget is held until the last event is sent (or the
+    client disconnects), not just until the response starts.
+    """
+    reservation = AsyncExitStack()
+    await reservation.enter_async_context(upload_budget.reserve(total_bytes, UPLOAD_QUEUE_TIMEOUT))
+    try:
+        inputs = await image_inputs(images)
+    except BaseException:
+        await reservation.aclose()
+        raise
+
+    async def events():
+        counts = {"results": 0, "deduped": 0, "errors": 0}
+        try:
+            async for idx, record, error in stream_analysis(
+                inputs, latitude, longitude, user_id, email, model
+            ):
+                if error is None:
+                    counts["results"] += 1
+                    counts["deduped"] += bool(record.get("deduped"))
+                    yield stream_event(fmt, {"event": "result", "index": idx, "record": record})
+                else:
+                    counts["errors"] += 1
+                    yield stream_event(fmt, {
+                        "event": "error", "index": idx, "status": error[0], "error": error[1],
+                    })
+            yield stream_event(fmt, {"event": "summary", "total": len(inputs), **counts})
+        finally:
+            await reservation.aclose()
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return HeldStreamingResponse(
+        events(),
+        reservation,
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------------------------------------
+# Async analysis jobs
+# ---------------------------------------------------------
+def set_report_fields(image_hash: str, tracking_id: str, fields: dict):
+    fields = {**fields, "updated_at": datetime.utcnow().isoformat() + "Z"}
+    db.collection("pothole_reports").document(image_hash).update(fields)
+    invalidate_status(tracking_id)
+
+
+def process_analysis_job(job: dict):
+    """Worker side of POST /analyze?mode=async for one image."""
+    image_hash, tracking_id = job["image_hash"], job["tracking_id"]
+    latitude, longitude = job["latitude"], job["longitude"]
+    report_ref = db.collection("pothole_reports").document(image_hash)
+
+    # Re-run after its results were committed (crash before complete()).
+    if (report_ref.get().to_dict() or {}).get("analyzed_at"):
+        return
+
+    # While Gemini's circuit is open an attempt could only fail; wait it out
+    # instead of spending JOB_MAX_ATTEMPTS on an outage.
+    if model_governor.breaker.is_open():
+        raise RetryLater("Gemini circuit open", model_governor.breaker.retry_after())
+
+    set_report_fields(image_hash, tracking_id, {"status": "analyzing"})
+
+    img_bytes = bucket.blob(job["blob_name"]).download_as_bytes()
+    model_bytes, model_mime, thumbnail_uri, normalize_ms = make_model_copy(
+        img_bytes, job["content_type"], job["blob_name"]
+    )
+    item = PreparedImage(
+        image_hash=image_hash,
+        original_bytes=job.get("original_bytes") or len(img_bytes),
+        model_bytes=model_bytes,
+        model_mime=model_mime,
+        blob_name=job["blob_name"],
+        gcs_uri=f"gs://{POTHOLE_BUCKET}/{job['blob_name']}",
+        thumbnail_uri=thumbnail_uri,
+        perceptual_hash=None,
+        normalize_ms=normalize_ms,
+    )
+    try:
+        analysis = assess_images(get_gemini_model(), [item], latitude, longitude)[0]
+    except ImageProcessingError as e:
+        # Not attempted (circuit open, no capacity), or this was the half-open
+        # trial call and the circuit re-opened: the outage isn't this job's
+        # fault, so it goes back in the queue without using an attempt.
+        if e.retry_after is not None or model_governor.breaker.is_open():
+            set_report_fields(image_hash, tracking_id, {"status": "submitted"})
+            retry_after = e.retry_after if e.retry_after is not None else model_governor.breaker.retry_after()
+            raise RetryLater(e.message, retry_after)
+        raise RuntimeError(e.message)
+
+    fields = {
+        "type": analysis.get("type"),
+        "severity": analysis.get("severity"),
+        "urgency": analysis.get("urgency"),
+        "explanation": analysis.get("explanation"),
+        "gps": analysis.get("gps") or f"{latitude}, {longitude}",
+        "prefilter_confidence": analysis.get("prefilter_confidence"),
+        "thumbnail": thumbnail_uri,
+        "status": "analyzed",
+        "analyzed_at": datetime.utcnow().isoformat() + "Z",
+    }
+    fields["updated_at"] = fields["analyzed_at"]
+
+    from google.cloud import firestore
+
+    # The report and its rollup increment land together, once: a second run
+    # of the same job (requeued by a sweep, or after a crash) changes nothing.
+    @firestore.transactional
+    def store_analysis(transaction) -> bool:
+        current = report_ref.get(transaction=transaction).to_dict() or {}
+        if current.get("analyzed_at"):
+            if current.get("status") != "analyzed":
+                transaction.update(report_ref, {"status": "analyzed"})
+            return False
+        transaction.update(report_ref, fields)
+        rollups.add(
+            transaction,
+            {**fields, "latitude": latitude, "longitude": longitude},
+            day=(job.get("created_at") or fields["analyzed_at"])[:10],
+        )
+        return True
+
+    stored = store_analysis(db.transaction())
+    invalidate_status(tracking_id)
+    if stored:
+        add_to_tiles({**fields, "image_hash": image_hash, "latitude": latitude, "longitude": longitude})
+
+
+def give_up_analysis_job(job: dict, error: str):
+    set_report_fields(job["image_hash"], job["tracking_id"], {
+        "status": "analysis_failed",
+        "error": error,
+    })
+
+
+job_queue = None
+job_workers = None
+
+
+@app.on_event("startup")
+def start_job_workers():
+    global job_queue, job_workers
+    job_queue = JobQueue(JOB_QUEUE_PATH, max_attempts=JOB_MAX_ATTEMPTS)
+    job_workers = JobWorkerPool(
+        job_queue,
+        process_analysis_job,
+        workers=JOB_WORKERS,
+        on_give_up=give_up_analysis_job,
+    )
+    job_workers.start()
+    threading.Thread(target=sweep_stale_jobs_forever, daemon=True).start()
+
+
+def job_payload(record: dict) -> dict:
+    """Job for a stored report waiting for analysis (what run_analysis enqueues)."""
+    blob_name = record["image"].removeprefix(f"gs://{POTHOLE_BUCKET}/")
+    return {
+        "image_hash": record["image_hash"],
+        "tracking_id": record["tracking_id"],
+        "blob_name": blob_name,
+        "content_type": mimetypes.guess_type(blob_name)[0],
+        "original_bytes": None,
+        "latitude": record["latitude"],
+        "longitude": record["longitude"],
+        "created_at": record["created_at"],
+    }
+
+
+def sweep_stale_jobs() -> int:
+    """Queue here the reports waiting for analysis that no worker touched for JOB_STALE_SECONDS.
+
+    Each report is claimed in a transaction that bumps its updated_at, so
+    concurrent sweeps on other instances skip it. Needs a composite index
+    on pothole_reports (analyzed_at, updated_at).
+    """
+    from google.cloud import firestore
+
+    cutoff = (datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)).isoformat() + "Z"
+    queued_here = job_queue.pending_values("image_hash")
+
+    @firestore.transactional
+    def claim(transaction, ref) -> dict | None:
+        record = ref.get(transaction=transaction).to_dict() or {}
+        if (
+            "analyzed_at" not in record
+            or record["analyzed_at"] is not None
+            or record.get("status") not in ("submitted", "analyzing")
+            or (record.get("updated_at") or "") >= cutoff
+        ):
+            return None
+        transaction.update(ref, {"status": "submitted", "updated_at": datetime.utcnow().isoformat() + "Z"})
+        return record
+
+    requeued = 0
+    stale = (
+        db.collection("pothole_reports")
+        .where("analyzed_at", "==", None)
+        .where("updated_at", "<", cutoff)
+        .stream()
+    )
+    for doc in stale:
+        if doc.id in queued_here:
+            continue
+        record = claim(db.transaction(), doc.reference)
+        if record is None:
+            continue
+        job_queue.enqueue(job_payload(record))
+        invalidate_status(record["tracking_id"])
+        requeued += 1
+    return requeued
+
+
+def sweep_stale_jobs_forever():
+    while True:
+        try:
+            requeued = sweep_stale_jobs()
+            if requeued:
+                print(f"Requeued {requeued} stale analysis jobs")
+        except Exception as e:
+            print("Stale job sweep error:", e)
+        if JOB_SWEEP_SECONDS <= 0:
+            return
+        time.sleep(JOB_SWEEP_SECONDS)
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    if job_workers:
+        job_workers.stop()
+
+
 # ---------------------------------------------------------
 # API: GET /status/{tracking_id}
 # ---------------------------------------------------------
+def load_status_record(tracking_id: str) -> dict | None:
+    """Record for a tracking ID via its tracking_index pointer (two key reads)."""
+    pointer = db.collection("tracking_index").document(tracking_id).get()
+    if pointer.exists:
+        report = db.collection("pothole_reports").document(pointer.get("report_id")).get()
+        return report.to_dict() if report.exists else None
+
+    # Records written before tracking_index existed: query once, then backfill.
+    reports = (
+        db.collection("pothole_reports")
+        .where("tracking_id", "==", tracking_id)
+        .limit(1)
+        .get()
+    )
+    if not reports:
+        return None
+    db.collection("tracking_index").document(tracking_id).set({"report_id": reports[0].id})
+    return reports[0].to_dict()
+
+
+def record_etag(record: dict) -> str:
+    body = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def invalidate_status(tracking_id: str):
+    """Call whenever a report's status (or any field) changes."""
+    status_cache.invalidate(tracking_id)
+
+
 @app.get("/status/{tracking_id}")
 def status_lookup(tracking_id: str, request: Request):
     try:
@@ -266,18 +1983,25 @@ def status_lookup(tracking_id: str, request: Request):
         if not decoded:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        reports = (
-            db.collection("pothole_reports")
-            .where("tracking_id", "==", tracking_id)
-            .get()
-        )
+        cached = status_cache.get(tracking_id)
+        if cached is None:
+            record = load_status_record(tracking_id)
+            if record is None:
+                raise HTTPException(status_code=404, detail="Tracking ID not found")
+            record["found"] = True
+            cached = (record, record_etag(record))
+            status_cache.put(tracking_id, cached)
 
-        if not reports:
-            raise HTTPException(status_code=404, detail="Tracking ID not found")
+        record, etag = cached
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
 
-        record = reports[0].to_dict()
-        record["found"] = True
-        return record
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                return Response(status_code=304, headers=headers)
+
+        return JSONResponse(content=record, headers=headers)
 
     except HTTPException:
         raise
@@ -288,8 +2012,44 @@ def status_lookup(tracking_id: str, request: Request):
 # ---------------------------------------------------------
 # API: GET /myreports
 # ---------------------------------------------------------
+# What ``fields`` may select: the fields build_record and the job worker write.
+MYREPORTS_FIELDS = {
+    "type", "severity", "urgency", "explanation", "gps", "latitude", "longitude", "geohash",
+    "image", "thumbnail", "image_hash", "phash", "created_at", "updated_at", "analyzed_at",
+    "user_id", "email", "deduped", "tracking_id", "status", "prefilter_confidence",
+}
+
+
+def encode_cursor(created_at: str, doc_id: str) -> str:
+    """The last report of a page: created_at, and its document ID to break ties."""
+    body = json.dumps([created_at, doc_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(body).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.b64decode(padded, altchars=b"-_", validate=True).decode("utf-8"))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not (isinstance(values, list) and len(values) == 2 and all(isinstance(v, str) for v in values)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
 @app.get("/myreports")
-def my_reports(request: Request):
+def my_reports(
+    request: Request,
+    limit: int = MYREPORTS_DEFAULT_LIMIT,
+    start_after: str | None = None,
+    fields: str | None = None,
+    order: str = "desc",
+):
+    """One page of the caller's reports ordered by created_at.
+
+    Pass the returned ``next_cursor`` as ``start_after`` for the next
+    page; ``fields=type,severity,...`` limits which fields are returned.
+    """
     try:
         id_token = request.headers.get("x-user-token")
         if not id_token:
@@ -303,16 +2063,368 @@ def my_reports(request: Request):
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid Firebase token (no uid)")
 
-        docs = (
+        if not (1 <= limit <= MYREPORTS_MAX_LIMIT):
+            raise HTTPException(
+                status_code=400, detail=f"limit must be between 1 and {MYREPORTS_MAX_LIMIT}"
+            )
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+        selected = None
+        if fields:
+            selected = {f.strip() for f in fields.split(",") if f.strip()}
+            unknown = selected - MYREPORTS_FIELDS
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+        direction = "DESCENDING" if order == "desc" else "ASCENDING"  # firestore.Query constants
+        # Document ID as the tiebreak: reports created in the same instant
+        # can't be skipped (or repeated) at a page boundary.
+        query = (
             db.collection("pothole_reports")
             .where("user_id", "==", user_id)
-            .get()
+            .order_by("created_at", direction=direction)
+            .order_by("__name__", direction=direction)
+            .limit(limit)
         )
+        if selected is not None:
+            # created_at is always kept: it is part of the pagination cursor.
+            query = query.select(sorted(selected | {"created_at"}))
+        if start_after:
+            query = query.start_after(decode_cursor(start_after))
 
-        results = [d.to_dict() for d in docs]
-        return {"reports": results}
+        docs = query.stream()
+        # Pull the first document now so query errors still produce a 500.
+        first = next(docs, None)
+
+        def body():
+            yield '{"reports": ['
+            count = 0
+            last = None
+            doc = first
+            while doc is not None:
+                record = doc.to_dict()
+                yield ("," if count else "") + json.dumps(record, default=str)
+                last = (record.get("created_at"), doc.id)
+                count += 1
+                doc = next(docs, None)
+            next_cursor = encode_cursor(*last) if count == limit and last and last[0] else None
+            yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+        return StreamingResponse(body(), media_type="application/json")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {str(e)}"})
+
+
+# ---------------------------------------------------------
+# API: GET /export
+# ---------------------------------------------------------
+EXPORT_ORDER_FIELDS = ("created_at", "updated_at")
+
+
+def can_export(decoded: dict) -> bool:
+    if decoded.get("export") is True:
+        return True
+    user_id = decoded.get("user_id") or decoded.get("uid")
+    return bool(EXPORT_USERS & {user_id, decoded.get("email")} - {None})
+
+
+def parse_watermark(value: str) -> str:
+    """``since`` as a timestamp string comparable with stored created_at/updated_at."""
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid since {value!r}; expected an ISO 8601 timestamp")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    # Always with microseconds: "...:05Z" would sort after "...:05.1Z".
+    return moment.isoformat(timespec="microseconds") + "Z"
+
+
+def export_pages(order_field: str, since: str | None, page_size: int = EXPORT_PAGE_SIZE):
+    """Reports ordered by ``order_field`` (from ``since`` on), one list of dicts per page.
+
+    Each page is its own query resuming after the last document of the
+    previous one, so no Firestore stream stays open across the export.
+    """
+    query = db.collection("pothole_reports").order_by(order_field)
+    if since:
+        query = query.where(order_field, ">=", since)
+    last = None
+    while True:
+        page_query = query.limit(page_size)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        snaps = list(page_query.stream())
+        if snaps:
+            yield [snap.to_dict() for snap in snaps]
+            last = snaps[-1]
+        if len(snaps) < page_size:
+            return
+
+
+@app.get("/export")
+def export_reports(
+    request: Request,
+    format: str = "ndjson",
+    since: str | None = None,
+    by: str = "created_at",
+):
+    """All reports, or those created (``by=created_at``) or changed
+    (``by=updated_at``) at or after ``since``, as NDJSON, CSV or Parquet.
+
+    The response carries ``X-Export-Started``; pass it back as ``since``
+    for the next incremental export. ``since`` is inclusive and clients
+    should step it back a little to cover writes still in flight, so a
+    report can appear in two exports; dedupe on image_hash. Reports
+    written before updated_at was stamped only appear with by=created_at.
+    """
+    try:
+        id_token = request.headers.get("x-user-token")
+        if not id_token:
+            raise HTTPException(status_code=401, detail="Missing token")
+
+        decoded = verify_firebase_token(id_token)
+        if not decoded:
+            raise HTTPException(status_code=401, detail="Invalid Firebase token")
+        if not can_export(decoded):
+            raise HTTPException(status_code=403, detail="Not allowed to export reports")
+
+        if format not in export.ENCODERS:
+            raise HTTPException(
+                status_code=400, detail=f"format must be one of {', '.join(export.ENCODERS)}"
+            )
+        if format == "parquet" and not export.parquet_available():
+            raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+        if by not in EXPORT_ORDER_FIELDS:
+            raise HTTPException(status_code=400, detail="by must be 'created_at' or 'updated_at'")
+        watermark = parse_watermark(since) if since else None
+
+        started = datetime.utcnow().isoformat(timespec="microseconds") + "Z"
+        pages = export_pages(by, watermark)
+        # Fetch the first page now so query errors still produce a 500.
+        first = next(pages, None)
+
+        def all_pages():
+            if first is not None:
+                yield first
+                yield from pages
+
+        return StreamingResponse(
+            export.ENCODERS[format](all_pages()),
+            media_type=export.MEDIA_TYPES[format],
+            headers={
+                "X-Export-Started": started,
+                "Content-Disposition": f'attachment; filename="pothole_reports{export.EXTENSIONS[format]}"',
+            },
+        )
 
     except HTTPException:
         raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {str(e)}"})
+
+
+# ---------------------------------------------------------
+# API: GET /nearby
+# ---------------------------------------------------------
+# Anyone signed in can query any area: never who reported what.
+NEARBY_FIELDS = [
+    "type", "severity", "urgency", "explanation", "status",
+    "latitude", "longitude", "thumbnail", "created_at", "updated_at",
+]
+
+
+@app.get("/nearby")
+def nearby(
+    request: Request,
+    lat: float,
+    lon: float,
+    radius: float = 200,
+    limit: int = 100,
+):
+    try:
+        id_token = request.headers.get("x-user-token")
+        if not id_token:
+            raise HTTPException(status_code=401, detail="Missing token")
+
+        decoded = verify_firebase_token(id_token)
+        if not decoded:
+            raise HTTPException(status_code=401, detail="Invalid Firebase token")
+
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise HTTPException(status_code=400, detail="Invalid coordinates")
+        if not (0 < radius <= NEARBY_MAX_RADIUS_M):
+            raise HTTPException(
+                status_code=400,
+                detail=f"radius must be between 0 and {NEARBY_MAX_RADIUS_M:g} metres",
+            )
+
+        reports = geo.query_nearby(
+            db.collection("pothole_reports"), lat, lon, radius,
+            limit=min(max(1, limit), NEARBY_MAX_LIMIT),
+            fields=NEARBY_FIELDS,
+        )
+        return {"reports": reports}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {str(e)}"})
+
+
+# ---------------------------------------------------------
+# API: GET /stats (dashboard rollups)
+# ---------------------------------------------------------
+def parse_day(value: str | None, default: date) -> date:
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date {value!r}; expected YYYY-MM-DD")
+
+
+@app.get("/stats")
+def stats(
+    request: Request,
+    cell: str | None = None,
+    lat: float | None = None,
+    lon: float | None = None,
+    start: str | None = None,
+    end: str | None = None,
+):
+    try:
+        id_token = request.headers.get("x-user-token")
+        if not id_token:
+            raise HTTPException(status_code=401, detail="Missing token")
+
+        decoded = verify_firebase_token(id_token)
+        if not decoded:
+            raise HTTPException(status_code=401, detail="Invalid Firebase token")
+
+        if cell:
+            cells = list(dict.fromkeys(c.strip().lower() for c in cell.split(",") if c.strip()))
+            if any(len(c) != ROLLUP_PRECISION or set(c) - set(geo.BASE32) for c in cells):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"cell must be geohashes of {ROLLUP_PRECISION} characters",
+                )
+            if len(cells) > STATS_MAX_CELLS:
+                raise HTTPException(status_code=400, detail=f"At most {STATS_MAX_CELLS} cells per query")
+        elif lat is not None and lon is not None:
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise HTTPException(status_code=400, detail="Invalid coordinates")
+            cells = [rollups.cell(lat, lon)]
+        else:
+            raise HTTPException(status_code=400, detail="Pass cell or lat and lon")
+
+        end_day = parse_day(end, datetime.utcnow().date())
+        start_day = parse_day(start, end_day - timedelta(days=6))
+        if start_day > end_day:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if (end_day - start_day).days + 1 > STATS_MAX_DAYS:
+            raise HTTPException(status_code=400, detail=f"At most {STATS_MAX_DAYS} days per query")
+
+        return {
+            "cells": cells,
+            "start": start_day.isoformat(),
+            "end": end_day.isoformat(),
+            **rollups.query(cells, start_day, end_day),
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {str(e)}"})
+
+
+# ---------------------------------------------------------
+# API: GET /tiles/{z}/{x}/{y} (map clusters)
+# ---------------------------------------------------------
+@app.get("/tiles/{z}/{x}/{y}")
+def tiles(request: Request, z: int, x: int, y: int):
+    try:
+        id_token = request.headers.get("x-user-token")
+        if not id_token:
+            raise HTTPException(status_code=401, detail="Missing token")
+
+        decoded = verify_firebase_token(id_token)
+        if not decoded:
+            raise HTTPException(status_code=401, detail="Invalid Firebase token")
+
+        try:
+            return tile_index.tile(z, x, y)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"SERVER ERROR: {str(e)}"})
+
+
+# ---------------------------------------------------------
+# API: GET /metrics (Prometheus)
+# ---------------------------------------------------------
+@app.get("/metrics")
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------------
+# Warmup (Cloud Run startup probe / min-instances)
+# ---------------------------------------------------------
+def warmup_steps() -> dict:
+    return {
+        # Creating the clients imports the SDKs; the reads open the connections.
+        "firestore": lambda: db.collection("system").document("tracking_counter").get(),
+        "storage": lambda: bucket.blob("_warmup").exists(),
+        "gemini": get_gemini_model,
+        "certs": lambda: services.token_verifier.warm_up(),
+    }
+
+
+def run_warmup_step(func) -> tuple[float, str | None]:
+    start = time.perf_counter()
+    try:
+        func()
+        error = None
+    except Exception as e:
+        error = str(e)
+    return round((time.perf_counter() - start) * 1000, 1), error
+
+
+@app.get("/_warmup")
+async def warmup(request: Request):
+    if not WARMUP_TOKEN:
+        raise HTTPException(status_code=404, detail="Warmup disabled")
+    token = request.headers.get("x-warmup-token") or ""
+    if not hmac.compare_digest(token.encode("utf-8"), WARMUP_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid warmup token")
+
+    steps = warmup_steps()
+    outcomes = await asyncio.gather(*(run_in_pipeline(run_warmup_step, f) for f in steps.values()))
+    report = {}
+    for name, (ms, error) in zip(steps, outcomes):
+        report[name] = {"ms": ms, "ok": error is None}
+        if error:
+            report[name]["error"] = error
+    status = 200 if all(r["ok"] for r in report.values()) else 503
+    return JSONResponse(status_code=status, content=report)
+
+
+@app.on_event("startup")
+def start_warmup():
+    if WARMUP_ON_STARTUP:
+        def run():
+            for name, func in warmup_steps().items():
+                ms, error = run_warmup_step(func)
+                print(f"Warmup {name}: {ms} ms" + (f" ({error})" if error else ""))
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,269 @@
+import time
+import random
+import threading
+
+from google.api_core import exceptions
+
+# Errors worth retrying: quota (429), overload / outage (500, 503, 504) and
+# connection trouble. Anything else (bad request, auth) fails immediately.
+RETRYABLE = (
+    exceptions.TooManyRequests,
+    exceptions.ResourceExhausted,
+    exceptions.InternalServerError,
+    exceptions.ServiceUnavailable,
+    exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+OVERLOAD = (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.ServiceUnavailable)
+# Quota errors are handled by backing off, not by opening the circuit.
+QUOTA = (exceptions.TooManyRequests, exceptions.ResourceExhausted)
+
+
+class ModelUnavailable(Exception):
+    """The call was not attempted: circuit open, or no capacity within the wait budget."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------
+# Token bucket (requests per second against our quota)
+# ---------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline: float) -> bool:
+        """Take one token, sleeping until one is free; False if that's past ``deadline``."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+# ---------------------------------------------------------
+# AIMD adaptive concurrency
+# ---------------------------------------------------------
+class AdaptiveConcurrency:
+    """Concurrency limit that grows by ~1 per window of successes and halves on overload.
+
+    Decreases are applied at most once per ``cooldown`` so one burst of
+    429s from calls already in flight only counts once.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, overloaded: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+# ---------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------
+class CircuitBreaker:
+    """closed -> open after ``threshold`` consecutive failures; after
+    ``reset_timeout`` one trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit."""
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and self.retry_after() > 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.retry_after() > 0:
+                return False
+            if self._trial_running:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_running = True
+            return True
+
+    def record(self, success: bool | None):
+        """``None`` records nothing about health but ends a half-open trial."""
+        with self._lock:
+            self._trial_running = False
+            if success is None:
+                if self.state == self.HALF_OPEN:
+                    self.state = self.OPEN
+                return
+            if success:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+# ---------------------------------------------------------
+# Governor
+# ---------------------------------------------------------
+class ModelGovernor:
+    """Rate limit, adaptive concurrency, retry and circuit breaking for model calls.
+
+    ``call(fn)`` runs ``fn()`` once a token and a concurrency slot are
+    free, retrying retryable errors with full-jitter exponential backoff.
+    It raises ``ModelUnavailable`` without calling the model while the
+    circuit is open or if no capacity frees up within ``queue_timeout``.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        concurrency: AdaptiveConcurrency,
+        breaker: CircuitBreaker,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        queue_timeout: float = 30.0,
+    ):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+
+        self.calls = 0
+        self.retries = 0
+        self.overloads = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def call(self, fn):
+        deadline = time.monotonic() + self.queue_timeout
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise ModelUnavailable("Gemini circuit open", self.breaker.retry_after())
+            if not (self.bucket.acquire(deadline) and self.concurrency.acquire(deadline)):
+                self.breaker.record(None)
+                self._count("rejected")
+                raise ModelUnavailable("Gemini rate limit: no capacity in time", 1.0)
+
+            self._count("calls")
+            try:
+                result = fn()
+            except Exception as e:
+                overloaded = isinstance(e, OVERLOAD)
+                self.concurrency.release(overloaded=overloaded)
+                if overloaded:
+                    self._count("overloads")
+                retryable = isinstance(e, RETRYABLE)
+                # Only outages count against the circuit; a 400 or a 429 says
+                # nothing about whether the model is up.
+                self.breaker.record(None if isinstance(e, QUOTA) or not retryable else False)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if time.monotonic() + delay > deadline:
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+
+            self.concurrency.release()
+            self.breaker.record(True)
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "overloads": self.overloads,
+            "rejected": self.rejected,
+            "tokens": round(self.bucket.tokens, 2),
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "circuit_open": int(self.breaker.is_open()),
+            "circuit_opened": self.breaker.opened,
+        }
+
+
+class GovernedModel:
+    """Model wrapper whose ``generate_content`` goes through a ModelGovernor."""
+
+    def __init__(self, model, governor: ModelGovernor):
+        self.model = model
+        self.governor = governor
+        self.model_name = getattr(model, "model_name", "gemini")
+
+    def generate_content(self, *args, **kwargs):
+        return self.governor.call(lambda: self.model.generate_content(*args, **kwargs))
@@ -0,0 +1,193 @@
+import json
+import math
+import zlib
+import threading
+
+from PIL import Image, ImageOps
+
+from imaging import open_image
+
+# ---------------------------------------------------------
+# Perceptual hash (dHash)
+# ---------------------------------------------------------
+HASH_SIZE = 8
+SNAPSHOT_VERSION = 1
+LOAD_FIELDS = ["phash", "latitude", "longitude"]
+
+
+def dhash(source, hash_size: int = HASH_SIZE) -> int | None:
+    """64-bit difference hash; robust to re-compression and small resizes.
+
+    Returns None if Pillow cannot decode the image.
+    """
+    try:
+        img = open_image(source)
+        # Let the JPEG decoder downscale while decoding; much cheaper on phone photos.
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    except Exception as e:
+        print("Perceptual hash error:", e)
+        return None
+
+    pixels = img.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(text: str) -> int:
+    return int(text, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ---------------------------------------------------------
+# BK-tree over Hamming distance
+# ---------------------------------------------------------
+class BKTree:
+    def __init__(self):
+        self._root = None  # (hash, value, {distance: child})
+        self.size = 0
+
+    def add(self, h: int, value):
+        self.size += 1
+        if self._root is None:
+            self._root = (h, value, {})
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, value, {})
+                return
+            node = child
+
+    def items(self):
+        """Every ``(hash, value)`` in the tree."""
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_hash, value, children = stack.pop()
+            yield node_hash, value
+            stack.extend(children.values())
+
+    def search(self, h: int, max_distance: int) -> list[tuple[int, object]]:
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_hash, value, children = stack.pop()
+            d = hamming(h, node_hash)
+            if d <= max_distance:
+                found.append((d, value))
+            for child_d, child in children.items():
+                if d - max_distance <= child_d <= d + max_distance:
+                    stack.append(child)
+        return found
+
+
+# ---------------------------------------------------------
+# Location-partitioned near-duplicate index
+# ---------------------------------------------------------
+class NearDuplicateIndex:
+    """One BK-tree per coarse lat/lon cell.
+
+    Lookups search the cell containing the point and its 8 neighbours,
+    so matches just across a cell boundary are still found.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01):
+        self.cell_degrees = cell_degrees
+        self._cells: dict[tuple[int, int], BKTree] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees),
+        )
+
+    def add(self, h: int, latitude: float, longitude: float, doc_id: str) -> bool:
+        """Index ``doc_id``; False if it already was (catch-up reads overlap)."""
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            tree = self._cells.get(cell)
+            if tree is None:
+                tree = self._cells[cell] = BKTree()
+            elif any(value == doc_id for _, value in tree.search(h, 0)):
+                return False
+            tree.add(h, doc_id)
+            return True
+
+    def add_record(self, doc_id: str, record: dict) -> bool:
+        """Index a stored report if it carries a ``phash``."""
+        if not record.get("phash") or record.get("latitude") is None or record.get("longitude") is None:
+            return False
+        return self.add(from_hex(record["phash"]), record["latitude"], record["longitude"], doc_id)
+
+    def find(self, h: int, latitude: float, longitude: float, max_distance: int):
+        """Return ``(distance, doc_id)`` of the closest match, or None."""
+        row, col = self._cell(latitude, longitude)
+        best = None
+        with self._lock:
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    tree = self._cells.get((row + dr, col + dc))
+                    if tree is None:
+                        continue
+                    for match in tree.search(h, max_distance):
+                        if best is None or match[0] < best[0]:
+                            best = match
+        return best
+
+    def __len__(self):
+        with self._lock:
+            return sum(t.size for t in self._cells.values())
+
+    def load(self, collection):
+        """Populate from existing records that carry a ``phash``."""
+        count = 0
+        for doc in collection.select(LOAD_FIELDS).stream():
+            count += self.add_record(doc.id, doc.to_dict() or {})
+        self.loaded = True
+        return count
+
+    def to_bytes(self, **meta) -> bytes:
+        """Header line of JSON (cell size plus ``meta``) followed by the compressed cells."""
+        with self._lock:
+            cells = [
+                [row, col, [[to_hex(h), doc_id] for h, doc_id in tree.items()]]
+                for (row, col), tree in self._cells.items()
+            ]
+        header = {"version": SNAPSHOT_VERSION, "cell_degrees": self.cell_degrees, **meta}
+        return json.dumps(header).encode("utf-8") + b"\n" + zlib.compress(json.dumps(cells).encode("utf-8"))
+
+    def restore(self, data: bytes) -> dict:
+        """Replace the index with a ``to_bytes`` snapshot; returns its header."""
+        line, _, body = data.partition(b"\n")
+        header = json.loads(line)
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported near-duplicate snapshot version {header.get('version')}")
+        if header.get("cell_degrees") != self.cell_degrees:
+            raise ValueError("Near-duplicate snapshot was taken with a different PHASH_CELL_DEGREES")
+        cells = {}
+        for row, col, entries in json.loads(zlib.decompress(body)):
+            tree = cells[(row, col)] = BKTree()
+            for h, doc_id in entries:
+                tree.add(from_hex(h), doc_id)
+        with self._lock:
+            self._cells = cells
+        self.loaded = True
+        return header
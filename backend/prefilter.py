@@ -0,0 +1,103 @@
+import math
+from dataclasses import dataclass
+
+import imaging
+
+# ---------------------------------------------------------
+# Local prefilter (CPU-only image statistics)
+# ---------------------------------------------------------
+# Statistics are taken on a small grayscale copy, so scores don't depend
+# on the upload's resolution.
+ANALYSIS_EDGE = 256
+
+VERDICTS = ("pass", "no_damage", "rejected")
+
+
+@dataclass
+class PrefilterResult:
+    confidence: float  # 0..1, how likely the image is worth a model call
+    verdict: str  # one of VERDICTS
+    reason: str
+    features: dict
+
+
+def _ramp(value: float, lo: float, hi: float) -> float:
+    """0 at or below ``lo``, 1 at or above ``hi``, linear in between."""
+    if value <= lo:
+        return 0.0
+    if value >= hi:
+        return 1.0
+    return (value - lo) / (hi - lo)
+
+
+def image_features(source) -> dict | None:
+    """Brightness, sharpness, road-likeness and texture of an image; None if it can't be decoded."""
+    import numpy as np
+
+    try:
+        img = imaging.open_image(source)
+        img.draft("RGB", (ANALYSIS_EDGE, ANALYSIS_EDGE))
+        img = img.convert("RGB")
+        img.thumbnail((ANALYSIS_EDGE, ANALYSIS_EDGE))
+    except Exception:
+        return None
+
+    rgb = np.asarray(img, dtype=np.float32) / 255.0
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    if min(gray.shape) < 3:
+        return None
+    high, low = rgb.max(axis=2), rgb.min(axis=2)
+    saturation = (high - low) / np.maximum(high, 1e-6)
+    laplacian = (
+        4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:]
+    )
+    gradient = np.abs(np.diff(gray, axis=1)).mean() + np.abs(np.diff(gray, axis=0)).mean()
+    lower = saturation[gray.shape[0] // 2:]
+    return {
+        "brightness": float(gray.mean()),
+        # Variance of the Laplacian: near zero for blurred or flat images.
+        "sharpness": float(laplacian.var() * 1000),
+        # Asphalt and concrete are grey; the road is usually the lower half of the frame.
+        "road": float((lower < 0.25).mean()),
+        # Mean intensity step between neighbouring pixels: cracks, edges, holes.
+        "texture": float(gradient * 100),
+    }
+
+
+def classify(features: dict, reject_below: float, no_damage_below: float) -> PrefilterResult:
+    """Score features; below ``reject_below`` the image is unusable, below ``no_damage_below`` it's plain road."""
+    checks = {
+        "too dark or overexposed": min(
+            _ramp(features["brightness"], 0.08, 0.2), 1 - _ramp(features["brightness"], 0.85, 0.97)
+        ),
+        "too blurry": _ramp(math.log10(max(features["sharpness"], 1e-6)), 0.0, 0.9),
+        "no road surface": _ramp(features["road"], 0.4, 0.8),
+    }
+    reason, usable = min(checks.items(), key=lambda kv: kv[1])
+    damage = _ramp(features["texture"], 1.5, 5.0)
+    confidence = round(min(usable, damage), 3)
+
+    if usable < reject_below:
+        return PrefilterResult(confidence, "rejected", reason, features)
+    if damage < no_damage_below:
+        return PrefilterResult(confidence, "no_damage", "smooth surface, no visible damage", features)
+    return PrefilterResult(confidence, "pass", "", features)
+
+
+def check(source, reject_below: float, no_damage_below: float) -> PrefilterResult | None:
+    features = image_features(source)
+    if features is None:
+        return None
+    return classify(features, reject_below, no_damage_below)
+
+
+def local_assessment(result: PrefilterResult, latitude: float, longitude: float) -> dict:
+    """The analysis stored instead of a model answer for a filtered image."""
+    no_damage = result.verdict == "no_damage"
+    return {
+        "type": "no_damage" if no_damage else "rejected",
+        "severity": 1 if no_damage else None,
+        "urgency": "low" if no_damage else None,
+        "explanation": f"Local prefilter: {result.reason} (confidence {result.confidence:.2f}); not sent to Gemini.",
+        "gps": f"{latitude}, {longitude}",
+    }
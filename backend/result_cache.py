@@ -0,0 +1,96 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+# ---------------------------------------------------------
+# Model result cache
+# ---------------------------------------------------------
+class AnalysisCache:
+    """Two-tier cache of Gemini assessments.
+
+    Keys are ``(image_hash, model_name, prompt_hash)`` so editing the
+    prompt or switching models never serves stale answers. The memory
+    tier is an LRU bounded by ``max_entries``; the optional SQLite tier
+    survives restarts of the same instance. Both expire after ``ttl``.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 7 * 86400, sqlite_path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._writes = 0
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(image_hash: str, model_name: str, prompt_hash: str) -> str:
+        return f"{image_hash}:{model_name}:{prompt_hash}"
+
+    def _remember(self, key: str, created: float, value: dict):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry:
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return dict(value)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, dict(value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now),
+                )
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    self._db.execute("DELETE FROM analysis_cache WHERE created < ?", (now - self.ttl,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+            }
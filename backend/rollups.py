@@ -0,0 +1,81 @@
+import random
+from datetime import date, timedelta
+
+import geo
+
+# ---------------------------------------------------------
+# Pre-aggregated report counts per geohash cell per day
+# ---------------------------------------------------------
+DIMENSIONS = ("type", "severity", "urgency")
+
+
+def _bucket(value) -> str:
+    """Map key for a dimension value; the model's free text is kept short."""
+    if value is None or value == "":
+        return "unknown"
+    return str(value).strip().lower()[:40] or "unknown"
+
+
+def merge_counts(into: dict, counts: dict):
+    into["total"] = into.get("total", 0) + counts.get("total", 0)
+    for dim in DIMENSIONS:
+        target = into.setdefault(dim, {})
+        for key, n in (counts.get(dim) or {}).items():
+            target[key] = target.get(key, 0) + n
+
+
+class Rollups:
+    """Counts of new reports by type, severity and urgency per (cell, day).
+
+    Each (cell, day) is split over ``shards`` documents and every report
+    increments one at random, so a busy cell doesn't serialize writes on a
+    single document. Reads fetch every shard of the requested cells and
+    days in one ``get_all``, so their cost depends on the date range, not
+    on how many reports exist.
+    """
+
+    def __init__(self, db, collection: str = "report_rollups", precision: int = 5, shards: int = 4):
+        self.db = db
+        self.collection = collection
+        self.precision = precision
+        self.shards = max(1, shards)
+
+    def cell(self, latitude: float, longitude: float) -> str:
+        return geo.encode(latitude, longitude, self.precision)
+
+    def _ref(self, cell: str, day: str, shard: int):
+        return self.db.collection(self.collection).document(f"{cell}_{day}_{shard}")
+
+    def add(self, batch, record: dict, day: str | None = None):
+        """Queue the increments for one new report on ``batch`` (or a transaction)."""
+        from google.cloud.firestore import Increment
+
+        day = day or record["created_at"][:10]
+        cell = self.cell(record["latitude"], record["longitude"])
+        fields = {"cell": cell, "date": day, "total": Increment(1)}
+        for dim in DIMENSIONS:
+            fields[dim] = {_bucket(record.get(dim)): Increment(1)}
+        batch.set(self._ref(cell, day, random.randrange(self.shards)), fields, merge=True)
+
+    def query(self, cells: list[str], start: date, end: date) -> dict:
+        """Totals and per-day counts for ``cells`` over ``start``..``end`` inclusive."""
+        days = [(start + timedelta(n)).isoformat() for n in range((end - start).days + 1)]
+        refs = [
+            self._ref(cell, day, shard)
+            for cell in cells
+            for day in days
+            for shard in range(self.shards)
+        ]
+        per_day: dict[str, dict] = {}
+        for snap in self.db.get_all(refs):
+            if snap.exists:
+                data = snap.to_dict()
+                merge_counts(per_day.setdefault(data["date"], {}), data)
+
+        totals: dict = {}
+        for counts in per_day.values():
+            merge_counts(totals, counts)
+        return {
+            "totals": totals or {"total": 0},
+            "days": [{"date": day, **per_day[day]} for day in days if day in per_day],
+        }
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+# ---------------------------------------------------------
+# Chunked upload helpers
+# ---------------------------------------------------------
+READ_CHUNK = 1024 * 1024
+
+
+def file_size(fileobj) -> int:
+    pos = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(pos)
+    return size
+
+
+def md5_file(fileobj, chunk_size: int = READ_CHUNK) -> str:
+    """MD5 of a seekable file, read in chunks so it never sits in memory whole."""
+    digest = hashlib.md5()
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------
+# Process-wide in-flight byte budget
+# ---------------------------------------------------------
+class BudgetExceeded(Exception):
+    pass
+
+
+class ByteBudget:
+    """Caps the bytes of image data being processed at once in this process.
+
+    Requests wait up to ``timeout`` for room; a request larger than the
+    whole budget is admitted alone once everything else has drained.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.waiting = 0
+        self._cond = None
+        self._loop = None
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._cond, self._loop = asyncio.Condition(), loop
+        return self._cond
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int, timeout: float):
+        nbytes = min(nbytes, self.capacity)
+        cond = self._condition()
+        async with cond:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    cond.wait_for(lambda: self.in_use + nbytes <= self.capacity),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                raise BudgetExceeded(f"{self.in_use} of {self.capacity} bytes in flight")
+            finally:
+                self.waiting -= 1
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            async with cond:
+                self.in_use -= nbytes
+                cond.notify_all()
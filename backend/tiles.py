@@ -0,0 +1,194 @@
+import json
+import math
+import zlib
+import threading
+
+from ttl_cache import TTLCache
+
+# ---------------------------------------------------------
+# Web Mercator tiles (same z/x/y scheme as OSM / Leaflet)
+# ---------------------------------------------------------
+MAX_LATITUDE = 85.05112878
+SEVERITIES = ("1", "2", "3", "4", "5", "unknown")
+_SEVERITY_SLOT = {s: i for i, s in enumerate(SEVERITIES)}
+SNAPSHOT_VERSION = 1
+LOAD_FIELDS = ["latitude", "longitude", "severity", "explanation", "updated_at"]
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> tuple[int, int]:
+    n = 1 << zoom
+    latitude = min(max(latitude, -MAX_LATITUDE), MAX_LATITUDE)
+    s = math.sin(math.radians(latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _severity_slot(value) -> int:
+    key = str(value).strip() if value is not None else ""
+    return 3 + _SEVERITY_SLOT.get(key, len(SEVERITIES) - 1)
+
+
+def mappable(record: dict) -> bool:
+    """Has a location and has been assessed (async submissions aren't, until their job runs)."""
+    if record.get("latitude") is None or record.get("longitude") is None:
+        return False
+    return record.get("severity") is not None or record.get("explanation") is not None
+
+
+# ---------------------------------------------------------
+# Grid index
+# ---------------------------------------------------------
+class TileIndex:
+    """Report counts per map grid cell at every zoom level, plus an LRU of rendered tiles.
+
+    A tile at zoom ``z`` is split into ``2**bin_bits`` x ``2**bin_bits``
+    bins; each bin is one grid cell at zoom ``z + bin_bits`` and becomes a
+    cluster with its count, centroid and severity breakdown. Every level
+    is kept up to date on ``add``, so rendering a tile is a fixed number
+    of dict lookups whatever the number of reports, and each write drops
+    only the cached tiles (one per zoom) that contain the new point.
+
+    It holds what it was loaded with plus what it is given with ``add``;
+    keeping it in step with other writers is up to the caller.
+    """
+
+    def __init__(self, max_zoom: int = 15, bin_bits: int = 3, cache_entries: int = 4096):
+        self.max_zoom = max_zoom
+        self.bin_bits = bin_bits
+        self.base = max_zoom + bin_bits
+        # cell -> [count, sum of latitudes, sum of longitudes, one count per SEVERITIES]
+        self._levels: list[dict[tuple[int, int], list]] = [{} for _ in range(self.base + 1)]
+        self._lock = threading.Lock()
+        self.cache = TTLCache(max_entries=cache_entries, ttl=math.inf)
+        self.loaded = False
+
+    def add(self, latitude: float, longitude: float, severity=None):
+        with self._lock:
+            x, y = self._count(latitude, longitude, severity)
+            for zoom in range(self.max_zoom + 1):
+                shift = self.base - zoom
+                self.cache.invalidate((zoom, x >> shift, y >> shift))
+
+    def _count(self, latitude: float, longitude: float, severity) -> tuple[int, int]:
+        """Add one report to every level; caller holds the lock. Returns its base cell."""
+        x, y = tile_xy(latitude, longitude, self.base)
+        slot = _severity_slot(severity)
+        for level in range(self.base, -1, -1):
+            shift = self.base - level
+            key = (x >> shift, y >> shift)
+            cell = self._levels[level].get(key)
+            if cell is None:
+                cell = self._levels[level][key] = [0, 0.0, 0.0] + [0] * len(SEVERITIES)
+            cell[0] += 1
+            cell[1] += latitude
+            cell[2] += longitude
+            cell[slot] += 1
+        return x, y
+
+    def tile(self, z: int, x: int, y: int) -> dict:
+        """Clusters of one tile; raises ValueError for a tile outside the grid."""
+        if not (0 <= z <= self.max_zoom and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError(f"No tile {z}/{x}/{y} (max zoom {self.max_zoom})")
+        key = (z, x, y)
+        # Rendered under the lock so a concurrent add can't be cached over.
+        with self._lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+            cells = self._levels[z + self.bin_bits]
+            side = 1 << self.bin_bits
+            clusters = []
+            total = 0
+            for bx in range(x * side, (x + 1) * side):
+                for by in range(y * side, (y + 1) * side):
+                    cell = cells.get((bx, by))
+                    if cell is None:
+                        continue
+                    count = cell[0]
+                    total += count
+                    clusters.append({
+                        "latitude": round(cell[1] / count, 6),
+                        "longitude": round(cell[2] / count, 6),
+                        "count": count,
+                        "severity": {s: n for s, n in zip(SEVERITIES, cell[3:]) if n},
+                    })
+            rendered = {"z": z, "x": x, "y": y, "count": total, "clusters": clusters}
+            self.cache.put(key, rendered)
+            return rendered
+
+    def cells(self) -> int:
+        with self._lock:
+            return len(self._levels[self.base])
+
+    # --- Snapshots ---
+    def to_bytes(self, **meta) -> bytes:
+        """Header line of JSON (grid shape plus ``meta``) followed by the compressed base-level cells."""
+        with self._lock:
+            cells = [[x, y, *cell] for (x, y), cell in self._levels[self.base].items()]
+        header = {"version": SNAPSHOT_VERSION, "max_zoom": self.max_zoom, "bin_bits": self.bin_bits, **meta}
+        return json.dumps(header).encode("utf-8") + b"\n" + zlib.compress(json.dumps(cells).encode("utf-8"))
+
+    def restore(self, data: bytes) -> dict:
+        """Replace the counts with a ``to_bytes`` snapshot; returns its header.
+
+        Only the base level is stored; the coarser levels are summed up here.
+        """
+        line, _, body = data.partition(b"\n")
+        header = json.loads(line)
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported tile snapshot version {header.get('version')}")
+        if (header.get("max_zoom"), header.get("bin_bits")) != (self.max_zoom, self.bin_bits):
+            raise ValueError("Tile snapshot was taken with a different TILE_MAX_ZOOM/TILE_BIN_BITS")
+        levels = [{} for _ in range(self.base + 1)]
+        for x, y, *cell in json.loads(zlib.decompress(body)):
+            levels[self.base][(x, y)] = cell
+            for level in range(self.base - 1, -1, -1):
+                shift = self.base - level
+                key = (x >> shift, y >> shift)
+                total = levels[level].get(key)
+                if total is None:
+                    levels[level][key] = list(cell)
+                else:
+                    for i, value in enumerate(cell):
+                        total[i] += value
+        with self._lock:
+            self._levels = levels
+            self.cache.clear()
+        self.loaded = True
+        return header
+
+    def load(self, query, chunk: int = 5000, accept=None):
+        """Populate from existing records that have been assessed.
+
+        ``accept(doc_id, data)``, if given, can pass over records (the
+        caller's own bookkeeping). Tiles rendered while loading are dropped
+        once it finishes instead of invalidating per record.
+        """
+        count = 0
+        pending = []
+        for doc in query.select(LOAD_FIELDS).stream():
+            data = doc.to_dict() or {}
+            if not mappable(data) or (accept is not None and not accept(doc.id, data)):
+                continue
+            pending.append((data["latitude"], data["longitude"], data.get("severity")))
+            if len(pending) >= chunk:
+                count += self.add_all(pending)
+        count += self.add_all(pending)
+        self.loaded = True
+        return count
+
+    def add_all(self, reports: list) -> int:
+        """Count ``(latitude, longitude, severity)`` reports in bulk and empty the list.
+
+        Drops every rendered tile once, instead of the per-report
+        invalidation ``add`` does.
+        """
+        with self._lock:
+            for report in reports:
+                self._count(*report)
+            self.cache.clear()
+        n = len(reports)
+        reports.clear()
+        return n
@@ -0,0 +1,171 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import requests
+from jose import jwt
+from google.auth import jwt as google_jwt
+
+# ---------------------------------------------------------
+# Google signing cert cache
+# ---------------------------------------------------------
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def parse_max_age(cache_control: str | None, default: int) -> int:
+    if not cache_control:
+        return default
+    m = MAX_AGE_RE.search(cache_control)
+    return int(m.group(1)) if m else default
+
+
+class CertCache:
+    """Caches Google's securetoken signing certs.
+
+    Honours Cache-Control max-age, refreshes in a background thread
+    shortly before expiry, and lets only one caller fetch at a time.
+    An unknown ``kid`` forces a refetch (key rotation), rate-limited
+    by ``min_refetch_interval``.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session: requests.Session | None = None,
+        default_max_age: int = 3600,
+        refresh_margin: int = 300,
+        min_refetch_interval: int = 30,
+        timeout: float = 5.0,
+    ):
+        self.url = url
+        self.session = session or requests.Session()
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+
+        self._certs: dict = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.fetch_count = 0
+
+    def _fetch(self):
+        resp = self.session.get(self.url, timeout=self.timeout)
+        resp.raise_for_status()
+        certs = resp.json()
+        max_age = parse_max_age(resp.headers.get("Cache-Control"), self.default_max_age)
+        now = time.time()
+        self._certs = certs
+        self._fetched_at = now
+        self._expires_at = now + max_age
+        self.fetch_count += 1
+
+    def _fetch_locked(self, force: bool = False, kid: str | None = None):
+        with self._lock:
+            # Another caller may have refreshed while we waited.
+            now = time.time()
+            if not force and now < self._expires_at:
+                return
+            if kid is not None and kid in self._certs:
+                return
+            if force and now - self._fetched_at < self.min_refetch_interval:
+                return
+            self._fetch()
+
+    def _background_refresh(self):
+        try:
+            self._fetch_locked(force=True)
+        except Exception as e:
+            print("Cert background refresh error:", e)
+        finally:
+            self._refreshing = False
+
+    def certs(self) -> dict:
+        now = time.time()
+        if now >= self._expires_at:
+            self._fetch_locked()
+        elif now >= self._expires_at - self.refresh_margin and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return self._certs
+
+    def get_key(self, kid: str) -> str | None:
+        certs = self.certs()
+        if kid not in certs:
+            self._fetch_locked(force=True, kid=kid)
+            certs = self._certs
+        return certs.get(kid)
+
+
+# ---------------------------------------------------------
+# Verified token cache
+# ---------------------------------------------------------
+class VerifiedTokenCache:
+    """Bounded LRU of decoded tokens keyed by SHA-256 digest, valid until ``exp``."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        key = self.digest(token)
+        with self._lock:
+            decoded = self._entries.get(key)
+            if decoded is None:
+                return None
+            if decoded.get("exp", 0) <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return decoded
+
+    def put(self, token: str, decoded: dict):
+        if not decoded.get("exp"):
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = decoded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# ---------------------------------------------------------
+# Firebase ID token verifier
+# ---------------------------------------------------------
+class FirebaseTokenVerifier:
+    def __init__(self, certs: CertCache, tokens: VerifiedTokenCache, audience: str):
+        self.certs = certs
+        self.tokens = tokens
+        self.audience = audience
+
+    def warm_up(self):
+        self.certs.certs()
+
+    def verify(self, token: str) -> dict | None:
+        cached = self.tokens.get(token)
+        if cached:
+            return cached
+
+        kid = jwt.get_unverified_header(token)["kid"]
+        public_key = self.certs.get_key(kid)
+        if not public_key:
+            print("❌ Invalid key ID")
+            return None
+
+        decoded = google_jwt.decode(token, public_key, audience=self.audience)
+        self.tokens.put(token, decoded)
+        return decoded
@@ -0,0 +1,129 @@
+import random
+import threading
+from datetime import datetime
+
+
+# ---------------------------------------------------------
+# Block-leased tracking ID allocator
+# ---------------------------------------------------------
+class TrackingIdAllocator:
+    """Hands out ``PTH-YYYYMMDD-XXXXXX`` IDs from blocks leased in a transaction.
+
+    Each process leases ``block_size`` numbers at a time from a counter
+    document and serves them from memory, so Firestore sees one
+    transaction per block instead of two writes per ID.
+
+    With ``shards > 1`` blocks are leased from one of several shard
+    documents to spread the contention. Each shard serves blocks from a
+    chunk of ``chunk_blocks`` blocks it takes from the main counter, so
+    every number ever handed out, sharded or not, comes from that one
+    sequence and changing ``block_size`` or ``shards`` never reissues a
+    number. With ``daily_reset`` the counter restarts at 1 every UTC day.
+    """
+
+    def __init__(
+        self,
+        db,
+        block_size: int = 100,
+        shards: int = 1,
+        chunk_blocks: int = 10,
+        daily_reset: bool = False,
+        max_attempts: int = 25,
+        collection: str = "system",
+        document: str = "tracking_counter",
+        clock=datetime.utcnow,
+    ):
+        self.db = db
+        self.block_size = max(1, block_size)
+        self.shards = max(1, shards)
+        self.chunk_blocks = max(1, chunk_blocks)
+        self.daily_reset = daily_reset
+        self.max_attempts = max_attempts
+        self.collection = collection
+        self.document = document
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 1
+        self._end = 0
+        self.leases = 0
+
+    def _counter_ref(self, day: str, shard: int | None = None):
+        name = self.document
+        if self.daily_reset:
+            name = f"{name}_{day}"
+        if shard is not None:
+            name = f"{name}_shard{shard}"
+        return self.db.collection(self.collection).document(name)
+
+    def _lease(self, day: str) -> tuple[int, int]:
+        counter_ref = self._counter_ref(day)
+        block_size = self.block_size
+        shards = self.shards
+        shard = random.randrange(shards)
+        shard_refs = [self._counter_ref(day, k) for k in range(shards)]
+        chunk_size = block_size * self.chunk_blocks
+
+        # Imported here so importing this module doesn't load the Firestore SDK.
+        from google.cloud import firestore
+
+        def read(ref, transaction) -> dict:
+            snapshot = ref.get(transaction=transaction)
+            return (snapshot.to_dict() or {}) if snapshot.exists else {}
+
+        def legacy_end(transaction) -> int:
+            """Highest number the old ``blocks`` shard layout may have issued.
+
+            That layout numbered shard ``k``'s ``n``-th block
+            ``n * shards + k``; assumes the shards and block size it ran with.
+            """
+            end = 0
+            for k, snapshot in enumerate(self.db.get_all(shard_refs, transaction=transaction)):
+                blocks = ((snapshot.to_dict() or {}) if snapshot.exists else {}).get("blocks", 0)
+                if blocks:
+                    end = max(end, ((blocks - 1) * shards + k + 1) * block_size)
+            return end
+
+        @firestore.transactional
+        def lease(transaction):
+            if shards == 1:
+                # Same "value" field as the original single counter.
+                start = read(counter_ref, transaction).get("value", 0) + 1
+                end = start + block_size - 1
+                transaction.set(counter_ref, {"value": end}, merge=True)
+                return start, end
+
+            ref = shard_refs[shard]
+            data = read(ref, transaction)
+            start, chunk_end = data.get("next", 1), data.get("end", 0)
+            if start > chunk_end:
+                # A new chunk from the main counter; a shard's first one also
+                # starts above whatever the old layout handed out.
+                floor = legacy_end(transaction) if "end" not in data else 0
+                value = max(read(counter_ref, transaction).get("value", 0), floor)
+                start = value + 1
+                chunk_end = value + chunk_size
+                transaction.set(counter_ref, {"value": chunk_end}, merge=True)
+            end = min(start + block_size - 1, chunk_end)
+            transaction.set(ref, {"next": end + 1, "end": chunk_end}, merge=True)
+            return start, end
+
+        start, end = lease(self.db.transaction(max_attempts=self.max_attempts))
+        self.leases += 1
+        return start, end
+
+    def next_id(self) -> str:
+        day = self.clock().strftime("%Y%m%d")
+        with self._lock:
+            if self.daily_reset and day != self._day:
+                self._next, self._end = 1, 0
+            self._day = day
+
+            if self._next > self._end:
+                self._next, self._end = self._lease(day)
+
+            counter = self._next
+            self._next += 1
+
+        return f"PTH-{day}-{str(counter).zfill(6)}"
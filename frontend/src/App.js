@@ -26,11 +26,13 @@ function App() {
   const [checkID, setCheckID] = useState("");
   const [statusResult, setStatusResult] = useState(null);
   const [myReports, setMyReports] = useState([]);
+  const [myReportsCursor, setMyReportsCursor] = useState(null);
 
   const BASE_URL = "https://pothole-backend-117334135242.us-central1.run.app";
   const BACKEND_ANALYZE = `${BASE_URL}/analyze`;
   const BACKEND_STATUS = `${BASE_URL}/status`;
   const BACKEND_MYREPORTS = `${BASE_URL}/myreports`;
+  const ANALYZE_ATTEMPTS = 3;
 
   // ------------------------------------------------------------
   // ⭐ AUTO-LOGIN on refresh: Firebase Auth State Listener
@@ -233,7 +235,7 @@ function App() {
   }
 
   // ------------------------------------------------------------
-  // MY SUBMISSIONS PAGE (unchanged)
+  // MY SUBMISSIONS PAGE
   // ------------------------------------------------------------
   if (showMyReports) {
     return (
@@ -266,6 +268,24 @@ function App() {
           </div>
         ))}
 
+        {myReportsCursor && (
+          <button
+            onClick={() => loadMyReports(myReportsCursor)}
+            style={{
+              padding: "10px 20px",
+              background: "#007bff",
+              color: "white",
+              borderRadius: 8,
+              cursor: "pointer",
+              fontSize: 16,
+              marginTop: 20,
+              marginRight: 10,
+            }}
+          >
+            Load more
+          </button>
+        )}
+
         <button
           onClick={() => setShowMyReports(false)}
           style={{
@@ -333,11 +353,23 @@ function App() {
       formData.append("latitude", gps.lat);
       formData.append("longitude", gps.lon);
 
-      const response = await fetch(BACKEND_ANALYZE, {
-        method: "POST",
-        headers: { "X-User-Token": token },
-        body: formData,
-      });
+      // One key per submission: a retry after a dropped connection gets
+      // the first attempt's result instead of analyzing the images again.
+      const idempotencyKey = crypto.randomUUID();
+      let response;
+      for (let attempt = 1; ; attempt++) {
+        try {
+          response = await fetch(BACKEND_ANALYZE, {
+            method: "POST",
+            headers: { "X-User-Token": token, "Idempotency-Key": idempotencyKey },
+            body: formData,
+          });
+          break;
+        } catch (err) {
+          if (attempt >= ANALYZE_ATTEMPTS) throw err;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
+        }
+      }
 
       const data = await response.json();
 
@@ -388,14 +420,18 @@ function App() {
   }
 
   // ------------------------------------------------------------
-  // LOAD MY REPORTS (unchanged)
+  // LOAD MY REPORTS
   // ------------------------------------------------------------
-  async function loadMyReports() {
+  // /myreports is paged: pass the returned next_cursor to get the next page.
+  async function loadMyReports(cursor = null) {
     const token = await getValidToken();
     if (!token) return;
 
     try {
-      const response = await fetch(BACKEND_MYREPORTS, {
+      const url = cursor
+        ? `${BACKEND_MYREPORTS}?start_after=${encodeURIComponent(cursor)}`
+        : BACKEND_MYREPORTS;
+      const response = await fetch(url, {
         headers: { "X-User-Token": token },
       });
 
@@ -406,7 +442,8 @@ function App() {
         return;
       }
 
-      setMyReports(data.reports);
+      setMyReports((previous) => (cursor ? [...previous, ...data.reports] : data.reports));
+      setMyReportsCursor(data.next_cursor || null);
       setShowMyReports(true);
     } catch (err) {
       console.error(err);
@@ -459,7 +496,7 @@ function App() {
       </button>
 
       <button
-        onClick={loadMyReports}
+        onClick={() => loadMyReports()}
         style={{
           padding: "10px 20px",
           background: "#6f42c1",